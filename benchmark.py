@@ -0,0 +1,486 @@
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+
+from sudoku_board import BoardState
+from sudoku_generator import (DIFFICULTIES, GenerationStats, InstrumentedGenerator, SudokuGenerator, generate_many,
+                              generate_sudoku, generate_sudoku_and_solution)
+
+
+# Reproduces the original validity checks, which rescan the board on every probe
+# Used as the baseline that the bitmask engine is measured against
+class ScanningGenerator(SudokuGenerator):
+    def valid_in_row(self, row, num):
+        for i in range(self.row_length):
+            if self.board[int(row)][i] == num:
+                return False
+        return True
+
+    def valid_in_col(self, col, num):
+        for i in range(self.row_length):
+            if self.board[i][int(col)] == num:
+                return False
+        return True
+
+    def valid_in_box(self, row_start, col_start, num):
+        for row in range(int(row_start), int(row_start) + 3):
+            for col in range(int(col_start), int(col_start) + 3):
+                if self.board[int(row)][int(col)] == num:
+                    return False
+        return True
+
+    def is_valid(self, row, col, num):
+        if not self.valid_in_col(col, num):
+            return False
+        if not self.valid_in_row(row, num):
+            return False
+        row_start = int(row) - (int(row % 3))
+        col_start = int(col) - (int(col % 3))
+        if not self.valid_in_box(row_start, col_start, num):
+            return False
+        return True
+
+    # The original backtracker probed every digit through is_valid
+    def used_mask(self, row, col):
+        used = 0
+        for num in range(1, self.row_length + 1):
+            if not self.is_valid(row, col, num):
+                used |= 1 << num
+        return used
+
+
+# Builds one puzzle with the given generator class, the same way generate_sudoku does
+# The recursive fill is used because it is the path that goes through is_valid-style lookups
+def generate_with(generator_class, size, removed):
+    sudoku = generator_class(size, removed)
+    sudoku.fill_values("recursive")
+    sudoku.remove_cells()
+    return sudoku.get_board()
+
+
+# Times count puzzles for every seed and returns the best (fastest) seconds per puzzle
+def time_generation(generator_class, size, removed, count, seeds):
+    timings = []
+    for seed in seeds:
+        random.seed(seed)
+        start = time.perf_counter()
+        for i in range(count):
+            generate_with(generator_class, size, removed)
+        timings.append((time.perf_counter() - start) / count)
+    return min(timings)
+
+
+# Compares the scanning baseline against the bitmask engine used by generate_sudoku
+def bench_generate(args):
+    seeds = range(args.seeds)
+    print("recursive fill + remove_cells(%d): %d puzzles x %d seeds" % (args.removed, args.count, args.seeds))
+    baseline = time_generation(ScanningGenerator, 9, args.removed, args.count, seeds)
+    bitmask = time_generation(SudokuGenerator, 9, args.removed, args.count, seeds)
+    print("  scanning  %8.3f ms/puzzle" % (baseline * 1000))
+    print("  bitmask   %8.3f ms/puzzle" % (bitmask * 1000))
+    print("  speedup   %8.2fx" % (baseline / bitmask))
+
+
+# Times remove_cells on its own, with and without the uniqueness check
+def bench_remove(args):
+    print("remove_cells(%d removed): %d puzzles" % (args.removed, args.count))
+    for unique in (False, True):
+        random.seed(0)
+        timings = []
+        for i in range(args.count):
+            sudoku = SudokuGenerator(9, args.removed, unique)
+            sudoku.fill_values()
+            start = time.perf_counter()
+            sudoku.remove_cells()
+            timings.append(time.perf_counter() - start)
+        timings.sort()
+        print("  unique=%-5s median %7.3f ms  max %7.3f ms" % (unique, timings[len(timings) // 2] * 1000,
+                                                             timings[-1] * 1000))
+
+
+# Reports generate_sudoku time for each board size, removing half of the cells
+def bench_sizes(args):
+    print("generate_sudoku(size, size * size // 2): %d seeds per size" % args.seeds)
+    for size in args.sizes:
+        timings = []
+        for seed in range(args.seeds):
+            random.seed(seed)
+            start = time.perf_counter()
+            generate_sudoku(size, size * size // 2)
+            timings.append(time.perf_counter() - start)
+        timings.sort()
+        print("  %2dx%-2d median %9.3f ms  mean %9.3f ms  max %9.3f ms" % (
+            size, size, timings[len(timings) // 2] * 1000, sum(timings) / len(timings) * 1000,
+            timings[-1] * 1000))
+
+
+# Compares the fill strategies of fill_values on 9x9 boards: search nodes from an instrumented run,
+# and time from an uninstrumented run with the same seed
+def bench_search(args):
+    print("fill_values on 9x9: %d seeds per strategy" % args.seeds)
+    for strategy in ("recursive", "search"):
+        nodes = []
+        timings = []
+        for seed in range(args.seeds):
+            stats = GenerationStats()
+            InstrumentedGenerator(9, 0, rng=random.Random(seed), stats=stats).fill_values(strategy)
+            nodes.append(stats.nodes)
+            sudoku = SudokuGenerator(9, 0, rng=random.Random(seed))
+            timings.append(sample(lambda: sudoku.fill_values(strategy)))
+        nodes.sort()
+        timings.sort()
+        print("  %-9s nodes median %6d  mean %8.1f  max %6d | time median %7.3f ms  mean %7.3f ms  max %7.3f ms" % (
+            strategy, nodes[len(nodes) // 2], sum(nodes) / len(nodes), nodes[-1],
+            timings[len(timings) // 2] * 1000, sum(timings) / len(timings) * 1000, timings[-1] * 1000))
+
+
+# Measures generate_many throughput in puzzles per minute
+def bench_batch(args):
+    start = time.perf_counter()
+    total = 0
+    for board in generate_many(args.count, args.removed, workers=args.workers, seed=0, unique=args.unique):
+        total += 1
+    elapsed = time.perf_counter() - start
+    print("generate_many(%d, %d, workers=%s): %.2f s, %.0f puzzles/minute" % (
+        args.count, args.removed, args.workers, elapsed, total / elapsed * 60))
+
+
+# Compares full generation with symmetry derivation from a single seed puzzle, in puzzles per minute
+def bench_derive(args):
+    from sudoku_transform import derive_many
+    rng = random.Random(0)
+    start = time.perf_counter()
+    puzzle, solution = generate_sudoku_and_solution(9, args.removed, True, rng)
+    for i in range(args.count - 1):
+        generate_sudoku(9, args.removed, True, rng)
+    generated = time.perf_counter() - start
+    for flat in (False, True):
+        start = time.perf_counter()
+        for pair in derive_many(puzzle, solution, args.count * 100, rng, flat):
+            pass
+        derived = time.perf_counter() - start
+        print("%s: %d generated in %.2f s (%.0f/minute), %d derived (flat=%s) in %.2f s (%.0f/minute)" % (
+            "removed=%d" % args.removed, args.count, generated, args.count / generated * 60,
+            args.count * 100, flat, derived, args.count * 100 / derived * 60))
+
+
+# Compares a generate_sudoku loop with sudoku_batch.generate_batch, in puzzles per second
+def bench_numpy(args):
+    from sudoku_batch import generate_batch
+    rng = random.Random(0)
+    start = time.perf_counter()
+    for i in range(args.count):
+        generate_sudoku(9, args.removed, False, rng)
+    looped = time.perf_counter() - start
+    print("generate_sudoku loop: %d in %.2f s, %.0f puzzles/s" % (args.count, looped, args.count / looped))
+    for arrays in (False, True):
+        start = time.perf_counter()
+        generate_batch(args.count, args.removed, seed=0, arrays=arrays)
+        batched = time.perf_counter() - start
+        print("generate_batch(arrays=%s): %d in %.2f s, %.0f puzzles/s (%.1fx)" % (
+            arrays, args.count, batched, args.count / batched, looped / batched))
+
+
+# Measures canonical_form throughput on puzzles and solved grids, and HashIndex insertion speed
+def bench_canon(args):
+    import tempfile
+    from sudoku_canon import HashIndex, canonical_form
+    rng = random.Random(0)
+    pairs = [generate_sudoku_and_solution(9, args.removed, True, rng) for i in range(args.count)]
+    for name, boards in (("puzzles", [pair[0] for pair in pairs]), ("solved grids", [pair[1] for pair in pairs])):
+        start = time.perf_counter()
+        for board in boards:
+            canonical_form(board)
+        elapsed = time.perf_counter() - start
+        print("canonical_form on %d %s: %.3f s, %.1f ms each" % (len(boards), name, elapsed,
+                                                                 elapsed / len(boards) * 1000))
+    with tempfile.TemporaryDirectory() as directory:
+        index = HashIndex(os.path.join(directory, "index"))
+        keys = [rng.getrandbits(64) | 1 for i in range(100000)]
+        start = time.perf_counter()
+        for key in keys:
+            index.add(key)
+        elapsed = time.perf_counter() - start
+        index.close()
+    print("HashIndex.add: %d keys in %.3f s, %.1f us each" % (len(keys), elapsed, elapsed / len(keys) * 1e6))
+
+
+# Times a cold start of the command-line interface generating one puzzle, and checks that the
+# headless path never imports pygame
+def bench_startup(args):
+    here = os.path.dirname(os.path.abspath(__file__))
+    command = [sys.executable, "-m", "sudoku_cli", "generate"]
+    timings = []
+    for i in range(args.runs):
+        start = time.perf_counter()
+        subprocess.run(command, cwd=here, check=True, stdout=subprocess.DEVNULL)
+        timings.append(time.perf_counter() - start)
+    baseline = []
+    for i in range(args.runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", "pass"], check=True)
+        baseline.append(time.perf_counter() - start)
+    check = "import sudoku_cli, sudoku_board, sudoku_generator, sys; print('pygame' in sys.modules)"
+    loaded = subprocess.run([sys.executable, "-c", check], cwd=here, check=True,
+                            capture_output=True, text=True).stdout.strip()
+    timings.sort()
+    baseline.sort()
+    print("python -m sudoku_cli generate: median %.1f ms over %d runs (bare interpreter %.1f ms)" % (
+        timings[len(timings) // 2] * 1000, args.runs, baseline[len(baseline) // 2] * 1000))
+    print("pygame imported by the CLI: %s" % loaded)
+
+
+# Measures how many puzzles per second the technique-based rater grades
+def bench_rate(args):
+    from sudoku_rater import rate_puzzle
+    rng = random.Random(0)
+    puzzles = [generate_sudoku(9, DIFFICULTIES[difficulty], True, rng)
+               for i in range(args.count) for difficulty in DIFFICULTIES]
+    start = time.perf_counter()
+    for puzzle in puzzles:
+        rate_puzzle(puzzle)
+    elapsed = time.perf_counter() - start
+    print("rate_puzzle: %d puzzles (easy, medium and hard) in %.3f s, %.0f puzzles/s" % (
+        len(puzzles), elapsed, len(puzzles) / elapsed))
+
+
+# Benchmark suite
+#
+# Every case is timed once per seed (and per difficulty where it applies). A sample is the mean time
+# of one call over `number` back-to-back calls, and the suite reports the median and spread of the
+# samples in seconds. Results are written as JSON and can be compared against a saved baseline.
+
+# Times number calls of run() and returns the mean seconds per call
+def sample(run, number=1):
+    start = time.perf_counter()
+    for i in range(number):
+        run()
+    return (time.perf_counter() - start) / number
+
+
+# Summarises a list of samples in seconds
+def summarise(samples):
+    samples = sorted(samples)
+    return {
+        "median": samples[len(samples) // 2],
+        "min": samples[0],
+        "max": samples[-1],
+        "mean": sum(samples) / len(samples),
+        "samples": len(samples),
+    }
+
+
+# Builds the puzzle and solution used for one seed and difficulty, the same for every run
+def seeded_puzzle(seed, difficulty):
+    return generate_sudoku_and_solution(9, DIFFICULTIES[difficulty], True, random.Random(seed))
+
+
+# Times fill_remaining after the random diagonal fill, once per seed
+def suite_fill_remaining(seeds):
+    samples = []
+    for seed in seeds:
+        sudoku = SudokuGenerator(9, 0, rng=random.Random(seed))
+        sudoku.fill_diagonal()
+        samples.append(sample(lambda: sudoku.fill_remaining(0, sudoku.box_length)))
+    return {"fill_remaining": summarise(samples)}
+
+
+# Times remove_cells with the uniqueness check the game uses, per difficulty
+def suite_remove_cells(seeds):
+    results = {}
+    for difficulty, removed in DIFFICULTIES.items():
+        samples = []
+        for seed in seeds:
+            sudoku = SudokuGenerator(9, removed, True, random.Random(seed))
+            sudoku.fill_values()
+            samples.append(sample(sudoku.remove_cells))
+        results["remove_cells[%s]" % difficulty] = summarise(samples)
+    return results
+
+
+# Times is_full and check_board on a fresh puzzle per difficulty and on a solved board
+def suite_board_checks(seeds):
+    results = {}
+    for difficulty in DIFFICULTIES:
+        full = []
+        check = []
+        solved = []
+        for seed in seeds:
+            puzzle, solution = seeded_puzzle(seed, difficulty)
+            board = BoardState(puzzle, solution)
+            full.append(sample(board.is_full, 10000))
+            check.append(sample(board.check_board, 10000))
+            solved.append(sample(BoardState(solution, solution).check_board, 10000))
+        results["is_full[%s]" % difficulty] = summarise(full)
+        results["check_board[%s]" % difficulty] = summarise(check)
+        results["check_board[solved-%s]" % difficulty] = summarise(solved)
+    return results
+
+
+# Times Board.draw headlessly through SDL's dummy video driver, per difficulty: a full repaint, and
+# the frame after one sketch, which only redraws the cells that changed
+def suite_draw(seeds):
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    import pygame
+    import sudoku
+    pygame.init()
+    screen = pygame.display.set_mode((630, 730))
+    results = {}
+    for difficulty in DIFFICULTIES:
+        samples = []
+        moves = []
+        for seed in seeds:
+            grid = sudoku.Board(630, 730, screen, difficulty, seeded_puzzle(seed, difficulty))
+
+            def repaint():
+                grid.invalidate()
+                grid.draw()
+            samples.append(sample(repaint, 20))
+            empty = grid.values.index(0)
+            grid.select(empty // 9, empty % 9)
+            digits = iter(range(10000))
+
+            def move():
+                grid.sketch(next(digits) % 9 + 1)
+                grid.draw()
+            moves.append(sample(move, 200))
+        results["draw[%s]" % difficulty] = summarise(samples)
+        results["draw_move[%s]" % difficulty] = summarise(moves)
+    pygame.quit()
+    return results
+
+
+# Compares two result sets and returns rows of (name, baseline median, new median, ratio, regressed)
+# A case regresses when its median is more than threshold (a fraction) slower than the baseline
+def compare_results(baseline, results, threshold):
+    rows = []
+    for name, new in results["results"].items():
+        old = baseline["results"].get(name)
+        if old is None:
+            continue
+        ratio = new["median"] / old["median"] if old["median"] else float("inf")
+        rows.append((name, old["median"], new["median"], ratio, ratio > 1 + threshold))
+    return rows
+
+
+# Prints a comparison and returns the number of regressions
+def report_comparison(baseline, results, threshold):
+    regressions = 0
+    print("%-28s %14s %14s %8s" % ("case", "baseline", "current", "ratio"))
+    for name, old, new, ratio, regressed in compare_results(baseline, results, threshold):
+        regressions += regressed
+        print("%-28s %11.3f us %11.3f us %7.2fx%s" % (name, old * 1e6, new * 1e6, ratio,
+                                                      "  REGRESSION" if regressed else ""))
+    print("%d regression(s) at a %.0f%% threshold" % (regressions, threshold * 100))
+    return regressions
+
+
+# Runs every benchmark case, writes the JSON results and optionally compares them with a baseline
+def bench_suite(args):
+    seeds = range(args.seed, args.seed + args.seeds)
+    cases = [suite_fill_remaining, suite_remove_cells, suite_board_checks]
+    if not args.skip_render:
+        cases.append(suite_draw)
+    results = {}
+    for case in cases:
+        results.update(case(seeds))
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "seeds": list(seeds),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "results": results,
+    }
+    for name, result in results.items():
+        print("%-28s median %11.3f us  min %11.3f us  max %11.3f us" % (
+            name, result["median"] * 1e6, result["min"] * 1e6, result["max"] * 1e6))
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+        print("wrote %s" % args.output)
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        if report_comparison(baseline, report, args.threshold):
+            return 1
+    return 0
+
+
+# Compares two saved result files
+def bench_compare(args):
+    with open(args.baseline) as file:
+        baseline = json.load(file)
+    with open(args.results) as file:
+        results = json.load(file)
+    return 1 if report_comparison(baseline, results, args.threshold) else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sudoku performance benchmarks")
+    commands = parser.add_subparsers(dest="command", required=True)
+    generate = commands.add_parser("generate", help="time generate_sudoku against the scanning baseline")
+    generate.add_argument("--count", type=int, default=200)
+    generate.add_argument("--seeds", type=int, default=3)
+    generate.add_argument("--removed", type=int, default=40)
+    generate.set_defaults(run=bench_generate)
+    remove = commands.add_parser("remove", help="time remove_cells with and without the uniqueness check")
+    remove.add_argument("--count", type=int, default=200)
+    remove.add_argument("--removed", type=int, default=50)
+    remove.set_defaults(run=bench_remove)
+    sizes = commands.add_parser("sizes", help="time generation of 9x9, 16x16 and 25x25 boards")
+    sizes.add_argument("--seeds", type=int, default=20)
+    sizes.add_argument("--sizes", type=int, nargs="+", default=[9, 16, 25])
+    sizes.set_defaults(run=bench_sizes)
+    search = commands.add_parser("search", help="compare the recursive and iterative fill strategies")
+    search.add_argument("--seeds", type=int, default=500)
+    search.set_defaults(run=bench_search)
+    batch = commands.add_parser("batch", help="measure generate_many throughput")
+    batch.add_argument("--count", type=int, default=2000)
+    batch.add_argument("--removed", type=int, default=50)
+    batch.add_argument("--workers", type=int, default=None)
+    batch.add_argument("--unique", action="store_true")
+    batch.set_defaults(run=bench_batch)
+    derive = commands.add_parser("derive", help="compare full generation with symmetry derivation")
+    derive.add_argument("--count", type=int, default=100)
+    derive.add_argument("--removed", type=int, default=50)
+    derive.set_defaults(run=bench_derive)
+    numpy = commands.add_parser("numpy", help="compare a generate_sudoku loop with batched NumPy generation")
+    numpy.add_argument("--count", type=int, default=5000)
+    numpy.add_argument("--removed", type=int, default=50)
+    numpy.set_defaults(run=bench_numpy)
+    canon = commands.add_parser("canon", help="measure canonicalization and dedupe index speed")
+    canon.add_argument("--count", type=int, default=50)
+    canon.add_argument("--removed", type=int, default=50)
+    canon.set_defaults(run=bench_canon)
+    startup = commands.add_parser("startup", help="time a cold start of python -m sudoku_cli")
+    startup.add_argument("--runs", type=int, default=20)
+    startup.set_defaults(run=bench_startup)
+    rate = commands.add_parser("rate", help="measure technique-based rating throughput")
+    rate.add_argument("--count", type=int, default=300, help="puzzles per difficulty")
+    rate.set_defaults(run=bench_rate)
+    suite = commands.add_parser("suite", help="run every hot-path benchmark and write JSON results")
+    suite.add_argument("--seeds", type=int, default=10, help="number of seeds per case")
+    suite.add_argument("--seed", type=int, default=0, help="first seed")
+    suite.add_argument("--output", help="file to write the JSON results to")
+    suite.add_argument("--baseline", help="saved results to compare against")
+    suite.add_argument("--threshold", type=float, default=0.2, help="slowdown fraction flagged as a regression")
+    suite.add_argument("--skip-render", action="store_true", help="skip the pygame drawing benchmarks")
+    suite.set_defaults(run=bench_suite)
+    compare = commands.add_parser("compare", help="compare two saved JSON results")
+    compare.add_argument("baseline")
+    compare.add_argument("results")
+    compare.add_argument("--threshold", type=float, default=0.2)
+    compare.set_defaults(run=bench_compare)
+    args = parser.parse_args()
+    sys.exit(args.run(args))
+
+
+if __name__ == '__main__':
+    main()
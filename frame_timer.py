@@ -0,0 +1,97 @@
+import json
+import time
+from array import array
+
+# Per-phase timing of the game loop. Every pass of the loop is a frame: it starts when the loop wakes
+# up with events to handle and ends after the display update, so the time spent asleep waiting for
+# input is not part of any frame. The phases are, in loop order:
+#   events  handling the batch of input events
+#   save    writing the session file after a move
+#   check   checking a full board for a win or a loss
+#   draw    Board.draw
+#   hud     drawing the frame-time HUD, when it is shown
+#   update  pygame.display.update
+# The last capacity frames are kept in one preallocated array, a row of (start, phase seconds...)
+# per frame, so recording a frame allocates nothing and the timer can stay on all the time.
+PHASES = ("events", "save", "check", "draw", "hud", "update")
+PHASE_COLUMNS = {phase: column for column, phase in enumerate(PHASES, 1)}
+ROW_WIDTH = len(PHASES) + 1
+
+
+# Returns the p-th percentile (0-100) of a list of numbers, or None if it is empty
+def percentile(values, p):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+
+class FrameTimer:
+    def __init__(self, capacity=1024, clock=time.perf_counter):
+        self.capacity = capacity
+        self.clock = clock
+        self.samples = array("d", bytes(8 * capacity * ROW_WIDTH))
+        self.blank = array("d", bytes(8 * len(PHASES)))
+        # Frames recorded so far, including the ones the ring buffer has dropped
+        self.frames = 0
+        self.row = 0
+        self.last = 0.0
+        self.created = clock()
+
+    # Starts a frame
+    def start(self):
+        now = self.clock()
+        row = (self.frames % self.capacity) * ROW_WIDTH
+        self.samples[row] = now - self.created
+        self.samples[row + 1:row + ROW_WIDTH] = self.blank
+        self.row = row
+        self.last = now
+
+    # Adds the time since the previous mark (or the start) to a phase of the current frame
+    def mark(self, phase):
+        now = self.clock()
+        self.samples[self.row + PHASE_COLUMNS[phase]] += now - self.last
+        self.last = now
+
+    # Finishes the current frame
+    def end(self):
+        self.frames += 1
+
+    # Returns the kept frames, oldest first, as (start seconds, phase seconds...) tuples
+    def rows(self):
+        kept = min(self.frames, self.capacity)
+        first = self.frames - kept
+        rows = []
+        for frame in range(first, self.frames):
+            row = (frame % self.capacity) * ROW_WIDTH
+            rows.append(tuple(self.samples[row:row + ROW_WIDTH]))
+        return rows
+
+    # Returns frames per second over the last second of kept frames, and the p50, p99 and maximum
+    # milliseconds of every phase and of whole frames
+    def stats(self):
+        rows = self.rows()
+        result = {"frames": self.frames, "fps": 0}
+        if rows:
+            latest = rows[-1][0]
+            result["fps"] = sum(1 for row in rows if row[0] > latest - 1.0)
+        columns = [("total", [sum(row[1:]) for row in rows])]
+        columns.extend((phase, [row[column] for row in rows]) for phase, column in PHASE_COLUMNS.items())
+        for name, values in columns:
+            values = [value * 1000 for value in values]
+            result[name] = {"p50": percentile(values, 50), "p99": percentile(values, 99),
+                            "max": max(values, default=None)}
+        return result
+
+    # Writes the kept frames to path as JSON lines: the frame number, its start in seconds since the
+    # timer was created, and the milliseconds of every phase and of the whole frame
+    def dump(self, path):
+        rows = self.rows()
+        first = self.frames - len(rows)
+        with open(path, "w") as file:
+            for number, row in enumerate(rows, first):
+                record = {"frame": number, "start": round(row[0], 6)}
+                for phase, column in PHASE_COLUMNS.items():
+                    record[phase] = round(row[column] * 1000, 4)
+                record["total"] = round(sum(row[1:]) * 1000, 4)
+                file.write(json.dumps(record) + "\n")
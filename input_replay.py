@@ -0,0 +1,156 @@
+import base64
+import json
+import time
+
+import pygame
+from puzzle_prefetch import PuzzlePrefetcher
+from sudoku_board import board_to_string, string_to_board
+
+# Where the game gets its input events and its puzzles from. sudoku.main asks its input source for
+# every event it handles and for the puzzle of every new game, so a session can be recorded to a file
+# and replayed later, for example headlessly under SDL's dummy video driver:
+#   python sudoku.py --record session.jsonl
+#   python sudoku.py --replay session.jsonl --headless --frame-log frames.jsonl
+#
+# A recording is JSON lines. The first line is a header with the saved game that existed when the
+# recording started (base64, or null), so choosing "resume" replays the same game. After it, every
+# line is one call the game made, in order, with t the seconds since the recording started:
+#   {"call": "puzzle", "puzzle": "<81 chars>", "solution": "<81 chars>", "t": 0.8}
+#   {"call": "wait", "events": [{"type": 1025, "pos": [10, 10], "button": 1}], "t": 1.25}
+#   {"call": "get", "events": [], "t": 1.25}
+# Events keep only the attributes the game reads. Event types are pygame's numbers, so a recording
+# is meant to be replayed with the pygame version that made it.
+RECORDING_VERSION = 1
+EVENT_ATTRIBUTES = ("pos", "button", "key", "mod")
+
+
+# Returns an event as a JSON-ready dict
+def event_to_dict(event):
+    record = {"type": event.type}
+    for name in EVENT_ATTRIBUTES:
+        if hasattr(event, name):
+            value = getattr(event, name)
+            record[name] = list(value) if isinstance(value, tuple) else value
+    return record
+
+
+def dict_to_event(record):
+    attributes = {name: tuple(value) if isinstance(value, list) else value
+                  for name, value in record.items() if name != "type"}
+    return pygame.event.Event(record["type"], attributes)
+
+
+# Reads the events from pygame and the puzzles from a PuzzlePrefetcher
+class LiveInput:
+    def __init__(self):
+        # Keeps a puzzle ready for every difficulty, refilled in the background during play
+        self.prefetcher = PuzzlePrefetcher()
+
+    # Sleeps until an event arrives and returns it
+    def wait(self):
+        return pygame.event.wait()
+
+    # Returns the events that are queued, without waiting
+    def get(self):
+        return pygame.event.get()
+
+    # Returns a (puzzle, solution) pair for a new game
+    def puzzle(self, difficulty):
+        return self.prefetcher.get(difficulty)
+
+    def close(self):
+        pass
+
+
+# Plays live and writes every event and puzzle the game takes to a recording
+class InputRecorder(LiveInput):
+    def __init__(self, path, session_path):
+        super().__init__()
+        saved = None
+        try:
+            with open(session_path, "rb") as file:
+                saved = base64.b64encode(file.read()).decode("ascii")
+        except OSError:
+            pass
+        self.file = open(path, "w")
+        self.file.write(json.dumps({"version": RECORDING_VERSION, "session": saved}) + "\n")
+        self.started = time.perf_counter()
+
+    def write(self, record):
+        record["t"] = round(time.perf_counter() - self.started, 4)
+        self.file.write(json.dumps(record) + "\n")
+
+    def wait(self):
+        event = super().wait()
+        self.write({"call": "wait", "events": [event_to_dict(event)]})
+        return event
+
+    def get(self):
+        events = super().get()
+        self.write({"call": "get", "events": [event_to_dict(event) for event in events]})
+        return events
+
+    def puzzle(self, difficulty):
+        puzzle, solution = super().puzzle(difficulty)
+        self.write({"call": "puzzle", "puzzle": board_to_string(puzzle), "solution": board_to_string(solution)})
+        return puzzle, solution
+
+    def close(self):
+        self.file.close()
+
+
+# Feeds a recording back to the game instead of pygame's event queue
+# The game makes the same calls in the same order as long as it handles the events the same way; a
+# call that does not match the recording raises ValueError. Events the game posts for itself are in
+# the recording too, so the ones it posts during the replay are dropped. When the recording runs out,
+# the game gets a QUIT event. With realtime, every call waits until the time it was recorded at;
+# otherwise the replay runs as fast as the game can handle it.
+class InputReplay:
+    def __init__(self, path, realtime=False):
+        with open(path) as file:
+            header = json.loads(file.readline())
+            if header.get("version") != RECORDING_VERSION:
+                raise ValueError("unsupported recording version %r" % header.get("version"))
+            self.entries = [json.loads(line) for line in file if line.strip()]
+        self.session = base64.b64decode(header["session"]) if header.get("session") else None
+        self.position = 0
+        self.realtime = realtime
+        self.started = time.perf_counter()
+
+    # Returns the next entry, which must be for the given call, or None once the recording is over
+    def next_entry(self, call):
+        # Keeps SDL's own queue empty, as the recording already holds everything the game handled
+        pygame.event.clear()
+        if self.position == len(self.entries):
+            return None
+        entry = self.entries[self.position]
+        if entry["call"] != call:
+            raise ValueError("replay out of step at entry %d: the game asked for %s, the recording has %s" % (
+                self.position + 1, call, entry["call"]))
+        self.position += 1
+        if self.realtime:
+            delay = entry["t"] - (time.perf_counter() - self.started)
+            if delay > 0:
+                time.sleep(delay)
+        return entry
+
+    def wait(self):
+        entry = self.next_entry("wait")
+        if entry is None:
+            return pygame.event.Event(pygame.QUIT)
+        return dict_to_event(entry["events"][0])
+
+    def get(self):
+        entry = self.next_entry("get")
+        if entry is None:
+            return []
+        return [dict_to_event(record) for record in entry["events"]]
+
+    def puzzle(self, difficulty):
+        entry = self.next_entry("puzzle")
+        if entry is None:
+            raise ValueError("the recording ended before the game asked for a puzzle")
+        return string_to_board(entry["puzzle"]), string_to_board(entry["solution"])
+
+    def close(self):
+        pass
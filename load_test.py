@@ -0,0 +1,110 @@
+import argparse
+import asyncio
+import json
+import subprocess
+import sys
+import time
+
+from puzzle_server import percentile
+
+# Drives puzzle_server.py with many concurrent keep-alive clients and reports the latency percentiles
+# seen by the clients, the status codes and the server's own /metrics afterwards.
+#   python load_test.py --spawn --requests 2000 --concurrency 50
+# --spawn starts a server on --port for the run and stops it afterwards; without it, the script
+# expects one to be running already.
+
+
+# Sends one GET on an open connection and returns (status, body bytes)
+async def fetch(reader, writer, host, path):
+    writer.write(("GET %s HTTP/1.1\r\nHost: %s\r\n\r\n" % (path, host)).encode("latin-1"))
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if not line.strip():
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        if name.strip().lower() == "content-length":
+            length = int(value)
+    return status, await reader.readexactly(length)
+
+
+# One client: keeps a connection open and sends requests until the shared budget runs out
+async def client(args, budget, latencies, statuses):
+    reader, writer = await asyncio.open_connection(args.host, args.port)
+    path = "/puzzle?difficulty=%s" % args.difficulty
+    try:
+        while budget[0] > 0:
+            budget[0] -= 1
+            start = time.perf_counter()
+            status, body = await fetch(reader, writer, args.host, path)
+            latencies.append((time.perf_counter() - start) * 1000)
+            statuses[status] = statuses.get(status, 0) + 1
+    finally:
+        writer.close()
+
+
+async def run(args):
+    budget = [args.requests]
+    latencies = []
+    statuses = {}
+    start = time.perf_counter()
+    await asyncio.gather(*[client(args, budget, latencies, statuses) for i in range(args.concurrency)])
+    elapsed = time.perf_counter() - start
+    print("%d requests from %d clients in %.2f s, %.0f requests/s" % (
+        len(latencies), args.concurrency, elapsed, len(latencies) / elapsed))
+    print("latency ms: p50 %.2f  p99 %.2f  max %.2f" % (
+        percentile(latencies, 50), percentile(latencies, 99), max(latencies)))
+    print("statuses: %s" % ", ".join("%d x%d" % item for item in sorted(statuses.items())))
+    reader, writer = await asyncio.open_connection(args.host, args.port)
+    status, body = await fetch(reader, writer, args.host, "/metrics")
+    writer.close()
+    metrics = json.loads(body)
+    print("server latency ms: p50 %s  p99 %s" % (metrics["latency_ms"]["p50"], metrics["latency_ms"]["p99"]))
+    for difficulty, pool in metrics["pools"].items():
+        print("pool %s: ready %d, pending %d, served %d, waited %d, rejected %d" % (
+            difficulty, pool["ready"], pool["pending"], pool["served"], pool["waited"], pool["rejected"]))
+
+
+# Waits until something accepts connections on the port, or raises after timeout seconds
+async def wait_for_port(host, port, timeout):
+    deadline = time.perf_counter() + timeout
+    while True:
+        try:
+            reader, writer = await asyncio.open_connection(host, port)
+            writer.close()
+            return
+        except OSError:
+            if time.perf_counter() > deadline:
+                raise
+            await asyncio.sleep(0.1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the local puzzle server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--difficulty", default="medium")
+    parser.add_argument("--spawn", action="store_true", help="start a server for the run")
+    parser.add_argument("--warmup", type=float, default=2.0, help="seconds to let a spawned server fill its pools")
+    args = parser.parse_args()
+    server = None
+    if args.spawn:
+        server = subprocess.Popen([sys.executable, "puzzle_server.py", "--host", args.host, "--port", str(args.port)],
+                                  cwd=sys.path[0] or ".", stdout=subprocess.DEVNULL)
+    try:
+        if server is not None:
+            asyncio.run(wait_for_port(args.host, args.port, 30))
+            time.sleep(args.warmup)
+        asyncio.run(run(args))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,196 @@
+import argparse
+import mmap
+import os
+import random
+import struct
+import threading
+
+from sudoku_rater import generate_rated
+
+# On-disk puzzle bank for 9x9 puzzles
+#
+# The file starts with a fixed header: the magic bytes, a format version, the number of
+# difficulties, and for each difficulty its name, the index of its first record and its record
+# count. After the header come fixed-width records grouped by difficulty. Each record is a puzzle
+# followed by its solution, both packed two cells per byte (high nibble first, 0 for an empty cell).
+# Record i therefore starts at HEADER_SIZE + i * RECORD_SIZE, so any puzzle is read in O(1).
+MAGIC = b"SDKB"
+# Version 2 banks hold rated puzzles; version 1 banks picked them by the number of empty cells
+VERSION = 2
+HEADER = struct.Struct("<4sHH")
+INDEX_ENTRY = struct.Struct("<8sII")
+INDEX_SLOTS = 8
+HEADER_SIZE = HEADER.size + INDEX_SLOTS * INDEX_ENTRY.size
+CELLS = 81
+PACKED_SIZE = (CELLS + 1) // 2
+RECORD_SIZE = 2 * PACKED_SIZE
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "puzzles.bank")
+# Rating band (see sudoku_rater.RATING_BANDS) that the puzzles of each menu difficulty come from
+DIFFICULTY_BANDS = {"easy": "easy", "medium": "medium", "hard": "hard"}
+
+
+# Packs a 9x9 board into PACKED_SIZE bytes, two cells per byte
+def pack_board(board):
+    cells = [value for row in board for value in row] + [0]
+    return bytes((cells[i] << 4) | cells[i + 1] for i in range(0, CELLS, 2))
+
+
+# Unpacks PACKED_SIZE bytes back into a 9x9 board
+def unpack_board(data):
+    cells = []
+    for byte in data:
+        cells.append(byte >> 4)
+        cells.append(byte & 15)
+    return [cells[row * 9:row * 9 + 9] for row in range(9)]
+
+
+# Writes a bank file from a dict mapping difficulty name to a list of (puzzle, solution) pairs
+def write_bank(path, puzzles):
+    if len(puzzles) > INDEX_SLOTS:
+        raise ValueError("a bank holds at most %d difficulties" % INDEX_SLOTS)
+    index = b""
+    first = 0
+    for name, entries in puzzles.items():
+        index += INDEX_ENTRY.pack(name.encode("ascii"), first, len(entries))
+        first += len(entries)
+    index = index.ljust(INDEX_SLOTS * INDEX_ENTRY.size, b"\0")
+    # Writes to a temporary file first so a running game never sees a half-written bank
+    temp_path = path + ".tmp"
+    with open(temp_path, "wb") as file:
+        file.write(HEADER.pack(MAGIC, VERSION, len(puzzles)))
+        file.write(index)
+        for entries in puzzles.values():
+            for puzzle, solution in entries:
+                file.write(pack_board(puzzle))
+                file.write(pack_board(solution))
+    os.replace(temp_path, path)
+
+
+# Read-only view of a bank file through mmap; only the records that are picked get paged in
+# Raises ValueError, with the file closed again, if it is empty, truncated or not a bank
+class PuzzleBank:
+    def __init__(self, path):
+        self.file = open(path, "rb")
+        try:
+            self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # mmap refuses empty files
+            self.file.close()
+            raise
+        try:
+            self.index = self.read_index(path)
+        except ValueError:
+            self.close()
+            raise
+
+    # Returns a dict mapping difficulty name to (first record, record count), read from the header
+    def read_index(self, path):
+        if len(self.data) < HEADER_SIZE:
+            raise ValueError("%s is truncated" % path)
+        magic, version, count = HEADER.unpack_from(self.data, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("%s is not a version %d puzzle bank" % (path, VERSION))
+        if count > INDEX_SLOTS:
+            raise ValueError("%s has an invalid index" % path)
+        records = (len(self.data) - HEADER_SIZE) // RECORD_SIZE
+        index = {}
+        for slot in range(count):
+            name, first, size = INDEX_ENTRY.unpack_from(self.data, HEADER.size + slot * INDEX_ENTRY.size)
+            if first + size > records:
+                raise ValueError("%s is truncated" % path)
+            # A name that is not ASCII raises UnicodeDecodeError, which is a ValueError
+            index[name.rstrip(b"\0").decode("ascii")] = (first, size)
+        return index
+
+    # Returns how many puzzles the bank holds for a difficulty
+    def count(self, difficulty):
+        return self.index.get(difficulty, (0, 0))[1]
+
+    # Returns record number i of a difficulty as (puzzle, solution)
+    def get(self, difficulty, i):
+        first, size = self.index[difficulty]
+        if not 0 <= i < size:
+            raise IndexError("no puzzle %d for %s" % (i, difficulty))
+        offset = HEADER_SIZE + (first + i) * RECORD_SIZE
+        puzzle = unpack_board(self.data[offset:offset + PACKED_SIZE])
+        solution = unpack_board(self.data[offset + PACKED_SIZE:offset + RECORD_SIZE])
+        return puzzle, solution
+
+    # Returns a random (puzzle, solution) for a difficulty, or None if the bank has none
+    def random_puzzle(self, difficulty, rng=random):
+        size = self.count(difficulty)
+        if size == 0:
+            return None
+        return self.get(difficulty, rng.randrange(size))
+
+    def close(self):
+        self.data.close()
+        self.file.close()
+
+
+# Holds the bank opened by default_bank so the file is only opened once per process
+default_bank_cache = {}
+# Held while default_bank opens the bank, as the game's prefetch thread may ask for it at the same time
+default_bank_lock = threading.Lock()
+
+
+# Returns the bank at DEFAULT_PATH, or None when it is missing, empty or invalid
+def default_bank():
+    with default_bank_lock:
+        if "bank" not in default_bank_cache:
+            try:
+                default_bank_cache["bank"] = PuzzleBank(DEFAULT_PATH)
+            except (OSError, ValueError):
+                default_bank_cache["bank"] = None
+        return default_bank_cache["bank"]
+
+
+# Returns a random (puzzle, solution) from the default bank, or None so the caller can generate one
+def draw_puzzle(difficulty):
+    bank = default_bank()
+    if bank is None:
+        return None
+    return bank.random_puzzle(difficulty)
+
+
+# Returns a new unique (puzzle, solution) whose rating falls in the band of a menu difficulty
+def rated_puzzle(difficulty):
+    entry = None
+    while entry is None:
+        entry = generate_rated(DIFFICULTY_BANDS[difficulty])
+    puzzle, solution, rating = entry
+    return puzzle, solution
+
+
+# Returns a (puzzle, solution) for a difficulty from the default bank, generating a rated
+# puzzle on the spot when the bank is missing or has none for that difficulty
+def load_puzzle(difficulty):
+    entry = draw_puzzle(difficulty)
+    if entry is None:
+        entry = rated_puzzle(difficulty)
+    return entry
+
+
+# Fills a bank with freshly generated rated puzzles for every difficulty
+def build(args):
+    puzzles = {}
+    for name in DIFFICULTY_BANDS:
+        puzzles[name] = [rated_puzzle(name) for i in range(args.count)]
+        print("generated %d %s puzzles" % (args.count, name))
+    write_bank(args.output, puzzles)
+    print("wrote %s (%d bytes)" % (args.output, os.path.getsize(args.output)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the pre-generated puzzle bank")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build_parser = commands.add_parser("build", help="generate puzzles for every difficulty")
+    build_parser.add_argument("--count", type=int, default=1000, help="puzzles per difficulty")
+    build_parser.add_argument("--output", default=DEFAULT_PATH)
+    build_parser.set_defaults(run=build)
+    args = parser.parse_args()
+    args.run(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+import queue
+import threading
+
+from puzzle_bank import DIFFICULTY_BANDS, load_puzzle
+
+
+# Keeps one ready (puzzle, solution) pair for every difficulty
+# A single background thread builds a puzzle for each difficulty as soon as the prefetcher is created,
+# and builds the next one of a difficulty whenever its puzzle is taken, so starting a game, or
+# switching difficulty on restart, only has to take a puzzle that was prepared in the meantime. The
+# thread sleeps while every difficulty has its puzzle.
+class PuzzlePrefetcher:
+    def __init__(self, difficulties=DIFFICULTY_BANDS, source=load_puzzle):
+        self.source = source
+        self.ready = {}
+        # Difficulties waiting for the thread, and the set of them so each is only queued once
+        self.work = queue.Queue()
+        self.pending = set()
+        self.lock = threading.Lock()
+        for difficulty in difficulties:
+            self.request(difficulty)
+        self.thread = threading.Thread(target=self.refill, daemon=True, name="prefetch")
+        self.thread.start()
+
+    # Runs in the background: builds one puzzle for every difficulty it is handed
+    def refill(self):
+        while True:
+            difficulty = self.work.get()
+            entry = self.source(difficulty)
+            with self.lock:
+                self.ready[difficulty] = entry
+                self.pending.discard(difficulty)
+            self.work.task_done()
+
+    # Hands a difficulty to the background thread, unless it is already waiting for it
+    def request(self, difficulty):
+        with self.lock:
+            if difficulty not in self.pending:
+                self.pending.add(difficulty)
+                self.work.put(difficulty)
+
+    # Returns the ready puzzle of a difficulty, or builds one right away if the background thread
+    # has not caught up, and asks the thread for the next one
+    def get(self, difficulty):
+        with self.lock:
+            entry = self.ready.pop(difficulty, None)
+        if entry is None:
+            entry = self.source(difficulty)
+        self.request(difficulty)
+        return entry
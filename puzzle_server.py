@@ -0,0 +1,260 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from http import HTTPStatus
+from urllib.parse import parse_qs, urlsplit
+
+from puzzle_bank import load_puzzle
+from sudoku_board import board_to_string
+from sudoku_generator import DIFFICULTIES
+
+# Local HTTP/JSON service that hands out puzzles, run with: python puzzle_server.py [--port 8765]
+#
+#   GET /puzzle?difficulty=medium   {"difficulty": ..., "puzzle": "<81 chars>", "solution": "<81 chars>"}
+#   GET /metrics                    pool depths and counters, and request latency percentiles
+#
+# Every difficulty has an in-memory pool of ready puzzles. When a pool drops to its low watermark,
+# worker processes refill it in batches up to its high watermark, so requests normally just pop a
+# puzzle. When a pool is empty, requests wait for the next batch; once max_waiting requests are
+# already waiting, or a request has waited wait_timeout seconds, the server answers 503 with a
+# Retry-After header instead of queueing without limit.
+
+# Recent request latencies kept for the percentiles in /metrics
+LATENCY_WINDOW = 10000
+
+
+# Generates count (puzzle, solution) pairs in a worker process, as board strings
+def generate_batch(difficulty, count):
+    batch = []
+    for i in range(count):
+        puzzle, solution = load_puzzle(difficulty)
+        batch.append((board_to_string(puzzle), board_to_string(solution)))
+    return batch
+
+
+# Returns the p-th percentile (0-100) of a list of numbers, or None if it is empty
+def percentile(values, p):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+
+# Raised when a pool cannot hand out a puzzle in time
+class PoolBusy(Exception):
+    pass
+
+
+# Ready puzzles for one difficulty, refilled in the background by an executor
+class PuzzlePool:
+    def __init__(self, difficulty, executor, low=20, high=100, batch=10, max_batches=2, max_waiting=100):
+        self.difficulty = difficulty
+        self.executor = executor
+        self.low = low
+        self.high = high
+        self.batch = batch
+        self.max_batches = max_batches
+        self.max_waiting = max_waiting
+        self.ready = deque()
+        # Futures of requests waiting for a puzzle, oldest first
+        self.waiters = deque()
+        self.batches = 0
+        self.filling = False
+        self.served = 0
+        self.waited = 0
+        self.rejected = 0
+        self.generated = 0
+        self.errors = 0
+
+    # Puzzles that are ready or being generated
+    def depth(self):
+        return len(self.ready) + self.batches * self.batch
+
+    # Starts filling once the pool is down to the low watermark, and keeps submitting batches (at most
+    # max_batches at once) until ready and pending puzzles reach the high watermark
+    def replenish(self):
+        if len(self.ready) <= self.low or self.waiters:
+            self.filling = True
+        if not self.filling:
+            return
+        loop = asyncio.get_running_loop()
+        while self.depth() < self.high and self.batches < self.max_batches:
+            self.batches += 1
+            future = loop.run_in_executor(self.executor, generate_batch, self.difficulty, self.batch)
+            future.add_done_callback(self.batch_done)
+        if self.depth() >= self.high:
+            self.filling = False
+
+    # Hands a finished batch to the waiting requests first and keeps the rest
+    def batch_done(self, future):
+        self.batches -= 1
+        if future.cancelled():
+            return
+        if future.exception() is not None:
+            self.errors += 1
+            sys.stderr.write("puzzle batch for %s failed: %r\n" % (self.difficulty, future.exception()))
+            asyncio.get_running_loop().call_later(1, self.replenish)
+            return
+        batch = future.result()
+        self.generated += len(batch)
+        for entry in batch:
+            while self.waiters and self.waiters[0].done():
+                self.waiters.popleft()
+            if self.waiters:
+                self.waiters.popleft().set_result(entry)
+            else:
+                self.ready.append(entry)
+        self.replenish()
+
+    # Returns a (puzzle, solution) pair of board strings, waiting up to timeout seconds when the pool
+    # is empty; raises PoolBusy when too many requests are waiting already or the wait times out
+    async def get(self, timeout):
+        if self.ready:
+            entry = self.ready.popleft()
+            self.served += 1
+            self.replenish()
+            return entry
+        if len(self.waiters) >= self.max_waiting:
+            self.rejected += 1
+            raise PoolBusy()
+        waiter = asyncio.get_running_loop().create_future()
+        self.waiters.append(waiter)
+        self.waited += 1
+        self.replenish()
+        try:
+            entry = await asyncio.wait_for(waiter, timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise PoolBusy()
+        finally:
+            # A request that gave up must not keep counting against max_waiting
+            if waiter in self.waiters:
+                self.waiters.remove(waiter)
+        self.served += 1
+        return entry
+
+    def metrics(self):
+        return {"ready": len(self.ready), "pending": self.batches * self.batch, "waiting": len(self.waiters),
+                "low": self.low, "high": self.high, "served": self.served, "waited": self.waited,
+                "rejected": self.rejected, "generated": self.generated, "errors": self.errors}
+
+
+class PuzzleServer:
+    def __init__(self, host="127.0.0.1", port=8765, workers=None, low=20, high=100, batch=10,
+                 wait_timeout=5.0, max_waiting=100):
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.pool_options = {"low": low, "high": high, "batch": batch, "max_waiting": max_waiting}
+        self.wait_timeout = wait_timeout
+        self.pools = {}
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.requests = 0
+        self.started = time.time()
+
+    # Starts the worker processes, fills the pools and serves until cancelled
+    async def serve(self):
+        # Each worker reseeds its random state, so forked workers do not hand out the same puzzles
+        workers = self.workers or os.cpu_count() or 1
+        with ProcessPoolExecutor(workers, initializer=random.seed) as executor:
+            for difficulty in DIFFICULTIES:
+                self.pools[difficulty] = PuzzlePool(difficulty, executor, max_batches=workers, **self.pool_options)
+                self.pools[difficulty].replenish()
+            server = await asyncio.start_server(self.handle, self.host, self.port)
+            print("serving puzzles on http://%s:%d" % (self.host, self.port), flush=True)
+            async with server:
+                await server.serve_forever()
+
+    # Serves one connection, keeping it open between requests for HTTP/1.1 clients
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                method, target, version = request_line.decode("latin-1").split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if not line.strip():
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                if "content-length" in headers:
+                    await reader.readexactly(int(headers["content-length"]))
+                start = time.perf_counter()
+                status, body, extra = await self.route(method, target)
+                keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                payload = json.dumps(body).encode()
+                head = ["HTTP/1.1 %d %s" % (status, HTTPStatus(status).phrase),
+                        "Content-Type: application/json",
+                        "Content-Length: %d" % len(payload),
+                        "Connection: %s" % ("keep-alive" if keep_alive else "close")]
+                head.extend(extra)
+                writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + payload)
+                await writer.drain()
+                self.requests += 1
+                if target.startswith("/puzzle"):
+                    self.latencies.append((time.perf_counter() - start) * 1000)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    # Returns (status, JSON body, extra header lines) for a request
+    async def route(self, method, target):
+        if method != "GET":
+            return 405, {"error": "only GET is supported"}, ["Allow: GET"]
+        url = urlsplit(target)
+        if url.path == "/puzzle":
+            difficulty = parse_qs(url.query).get("difficulty", ["medium"])[0]
+            if difficulty not in self.pools:
+                return 400, {"error": "difficulty must be one of %s" % ", ".join(self.pools)}, []
+            try:
+                puzzle, solution = await self.pools[difficulty].get(self.wait_timeout)
+            except PoolBusy:
+                return 503, {"error": "no %s puzzle ready, retry later" % difficulty}, ["Retry-After: 1"]
+            return 200, {"difficulty": difficulty, "puzzle": puzzle, "solution": solution}, []
+        if url.path == "/metrics":
+            return 200, self.metrics(), []
+        return 404, {"error": "not found"}, []
+
+    def metrics(self):
+        latencies = list(self.latencies)
+        return {"uptime": round(time.time() - self.started, 1), "requests": self.requests,
+                "latency_ms": {"samples": len(latencies), "p50": percentile(latencies, 50),
+                               "p99": percentile(latencies, 99), "max": max(latencies, default=None)},
+                "pools": {difficulty: pool.metrics() for difficulty, pool in self.pools.items()}}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve puzzles over HTTP/JSON from pre-generated pools")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, help="generator processes, one per CPU by default")
+    parser.add_argument("--low", type=int, default=20, help="refill a pool once it has this many puzzles left")
+    parser.add_argument("--high", type=int, default=100, help="refill a pool up to this many puzzles")
+    parser.add_argument("--batch", type=int, default=10, help="puzzles generated per worker task")
+    parser.add_argument("--wait-timeout", type=float, default=5.0,
+                        help="seconds a request waits on an empty pool before a 503")
+    parser.add_argument("--max-waiting", type=int, default=100,
+                        help="requests that may wait on an empty pool before the rest get a 503")
+    args = parser.parse_args(argv)
+    server = PuzzleServer(args.host, args.port, args.workers, args.low, args.high, args.batch,
+                          args.wait_timeout, args.max_waiting)
+    try:
+        asyncio.run(server.serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
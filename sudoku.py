@@ -1,30 +1,139 @@
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
 import pygame
-from sudoku_generator import generate_sudoku
+from frame_timer import PHASES, FrameTimer
+from input_replay import InputRecorder, InputReplay, LiveInput
+from puzzle_bank import load_puzzle
+from sudoku_board import COORDS, BoardState, load_session, save_session
 
 # Sets colors for the program
 line_color = (103, 135, 93)
 background_color = (205, 232, 197)
 white = (255, 255, 255)
 dark_green = (31, 38, 26)
+conflict_color = (178, 34, 34)
+conflict_background = (240, 200, 190)
+sketched_color = (157, 172, 167)
+
+# Fonts, loaded once each and keyed by (name, size); a name of None is pygame's default font
+fonts = {}
+
+
+# Returns the font for (name, size), loading it the first time it is asked for
+# pygame.font.SysFont searches the installed fonts, which is too slow to repeat on every draw
+def get_font(name, size):
+    key = (name, size)
+    if key not in fonts:
+        fonts[key] = pygame.font.Font(None, size) if name is None else pygame.font.SysFont(name, size)
+    return fonts[key]
+
+
+# Every digit in every style it is drawn in, rendered once into one surface
+# Styles map to (font size, color); placed values look the same as the givens
+GLYPH_STYLES = {"value": (70, line_color), "conflict": (70, conflict_color),
+                "sketch": (60, sketched_color), "sketch_conflict": (60, conflict_color)}
+
+
+class GlyphAtlas:
+    def __init__(self, styles=GLYPH_STYLES):
+        glyphs = {}
+        for style, (size, color) in styles.items():
+            font = get_font(None, size)
+            for digit in range(1, 10):
+                glyphs[style, digit] = font.render(str(digit), True, color)
+        # One row per style, one column per digit, each slot as big as the largest glyph
+        width = max(glyph.get_width() for glyph in glyphs.values())
+        height = max(glyph.get_height() for glyph in glyphs.values())
+        self.surface = pygame.Surface((width * 9, height * len(styles)), pygame.SRCALPHA)
+        self.areas = {}
+        for row, style in enumerate(styles):
+            for digit in range(1, 10):
+                glyph = glyphs[style, digit]
+                area = pygame.Rect((digit - 1) * width, row * height, glyph.get_width(), glyph.get_height())
+                # The atlas starts out fully transparent, so taking the maximum copies the glyph exactly
+                self.surface.blit(glyph, area, special_flags=pygame.BLEND_RGBA_MAX)
+                self.areas[style, digit] = area
+
+    # Draws a digit in a style with its top left corner at position
+    def blit(self, target, style, digit, position):
+        target.blit(self.surface, position, self.areas[style, digit])
+
+
+# The parts of the game screen that never change during a game, built once on first use:
+#   background            the empty grid with the button bar below it
+#   conflict_background   the same with every cell shaded as a conflict, so a cell's square can be
+#                         copied from either one without redrawing the grid lines over it
+#   squares               the 70x70 screen square of every cell; the squares do not overlap, so each
+#                         cell can be redrawn on its own
+#   atlas                 the GlyphAtlas of the digits
+class RenderCache:
+    def __init__(self):
+        self.background = bake_background(False)
+        self.conflict_background = bake_background(True)
+        self.squares = [pygame.Rect(col * 70, row * 70, 70, 70) for row, col in COORDS]
+        self.atlas = GlyphAtlas()
+
+
+render_caches = []
+
+
+# Returns the shared RenderCache, building it the first time
+def render_cache():
+    if not render_caches:
+        render_caches.append(RenderCache())
+    return render_caches[0]
+
+
+# Returns a 630x730 surface with the grid and the button bar, optionally with every cell shaded as
+# a conflict under the grid lines
+def bake_background(shaded):
+    surface = pygame.Surface((630, 730))
+    surface.fill(background_color)
+    if shaded:
+        for row, col in COORDS:
+            pygame.draw.rect(surface, conflict_background, (col * 70 + 2, row * 70 + 2, 67, 67))
+    # Draws the lines between the cells, with bold lines to delineate the 3x3 boxes
+    for line in range(10):
+        width = 4 if line % 3 == 0 else 2
+        pygame.draw.line(surface, line_color, (0, line * 70), (630, line * 70), width)
+        # The left edge of the board has no line, as the window edge is there
+        if line:
+            pygame.draw.line(surface, line_color, (line * 70, 630), (line * 70, 0), width)
+    buttons(surface)
+    return surface
 
 
 # Defines the Cell class
 class Cell:
-    # This class represents a single cell in the Sudoku board. There are 81 Cells in a Board.
-    def __init__(self, value, row, col, screen=None):
+    # This class is a lightweight view of a single cell in the Sudoku board. The values themselves
+    # live in the Board's buffers; a Board creates its 81 views once, the first time one is selected.
+    __slots__ = ("board", "row", "col", "index", "rect")
+
+    def __init__(self, board, row, col):
         # Constructor for the Cell class
-        self.value = value
+        self.board = board
         self.row = row
         self.col = col
-        self.screen = screen
+        self.index = row * 9 + col
+        square_size = 70
+        self.rect = pygame.Rect(col * square_size + 2, row * square_size + 2, square_size - 3, square_size - 3)
+
+    @property
+    def value(self):
+        # Getter for this cell’s value
+        return self.board.values[self.index]
 
     def set_cell_value(self, value):
         # Setter for this cell’s value
-        self.value = value
+        self.board.set_value(self.row, self.col, value)
 
     def set_sketched_value(self, value):
         # Setter for this cell’s sketched value
-        self.sketched_value = value
+        self.board.set_sketch(self.index, value)
 
     def draw(self):
         # Draws this cell, along with the value inside it.
@@ -33,203 +142,128 @@ class Cell:
         # The cell is outlined red if it is currently selected.
         # draw red rectangle around cell
         red = (255, 0, 0)
-        square_size = 70
-        pygame.draw.rect(screen, red, pygame.Rect(self.col * square_size + 2, self.row *
-                                                  square_size + 2, square_size - 3, square_size - 3), 5)
-
-
-class Board:
-    # This class represents an entire Sudoku board. A Board object has 81 Cell objects.
-    def __init__(self, width, height, screen, difficulty):
-        # Checks the difficulty parameter and calls the generate_sudoku method accordingly
-        if difficulty == "easy":
-            self.board_list = generate_sudoku(9, 30)
-        elif difficulty == "medium":
-            self.board_list = generate_sudoku(9, 40)
-        elif difficulty == "hard":
-            self.board_list = generate_sudoku(9, 50)
-        self.board = []
-        # Creates a board filled with cell objects
-        for r in range(len(self.board_list)):
-            self.board.append([])
-            for c in range(0, 9):
-                temp_cell = Cell(self.board_list[r][c], r, c, screen)
-                self.board[r].append(temp_cell)
-        # Creates a sketched values board initially filled with zeros
-        self.sketched_values = []
-        dimensions = len(self.board_list)
-        for r in range(dimensions):
-            self.sketched_values.append([])
-            for c in range(dimensions):
-                self.sketched_values[r].append(0)
+        pygame.draw.rect(self.board.screen, red, self.rect, 5)
+
+
+# Flag bits of a drawn cell: its value conflicts, its sketch conflicts, it is selected
+DRAWN_CONFLICT = 1
+DRAWN_SKETCH_CONFLICT = 2
+DRAWN_SELECTED = 4
+# Flags no cell can have, which makes the next draw repaint every cell
+DRAWN_STALE = 255
+STALE_FLAGS = bytes([DRAWN_STALE]) * 81
+
+
+class Board(BoardState):
+    # This class draws a BoardState on the pygame screen and maps clicks to its cells.
+    # puzzle is an optional (puzzle, solution) pair that was prepared ahead of time
+    def __init__(self, width, height, screen, difficulty, puzzle=None):
+        # Without a prepared puzzle, picks one from the puzzle bank, and only generates one for
+        # the difficulty when the bank is missing or has none
+        if puzzle is None:
+            puzzle = load_puzzle(difficulty)
+        super().__init__(puzzle[0], puzzle[1])
+        self.screen = screen
+        self.cells = None
+        # What every cell looked like when it was last drawn: its value, its sketch and its DRAWN_ flags.
+        # They are compared in place, so deciding which cells to draw allocates nothing
+        self.drawn_values = bytearray(81)
+        self.drawn_sketches = bytearray(81)
+        self.drawn_flags = bytearray(STALE_FLAGS)
+        self.full_repaint = True
 
     # Defines the draw method of the class
     def draw(self):
-        # Draws an outline of the Sudoku grid, with bold lines to delineate the 3x3 boxes.
-        line_color = (103, 135, 93)
-        sketched_color = (157, 172, 167)
-        box_height = 210
-        box_width = 210
-        pygame.draw.line(screen, line_color, (0, 0), (630, 0), 4)
-        # Draws vertical and horizontal lines
-        for x in range(9):
-            pygame.draw.line(screen, line_color, (0, box_height), (900, box_height), 4)
-            box_height += 210
-        for x in range(9):
-            pygame.draw.line(screen, line_color, (box_width, 630), (box_width, 0), 4)
-            box_width += 210
-        line_width = 70
-        line_height = 70
-        for x in range(9):
-            pygame.draw.line(screen, line_color, (0, line_height), (900, line_height), 2)
-            line_height += 70
-        for x in range(9):
-            pygame.draw.line(screen, line_color, (line_width, 630), (line_width, 0), 2)
-            line_width += 70
-        # Sets the font for the numbers
-        font = pygame.font.Font(None, 70)
-        sketched_font = pygame.font.Font(None, 60)
-        square_size = 70
-        for x in range(9):
-            for y in range(9):
-                # since the 2d board list is a list of rows, swapping y and x here makes the rows
-                # on the screen match up with the rows in the 2d board list
-                tmp = self.board[x][y].value
-                if tmp != 0:
-                    nums = font.render(str(tmp), True, line_color)
-                    screen.blit(nums, (y * square_size + 22, x * square_size + 15))
-                if self.sketched_values[x][y] != 0:
-                    nums = sketched_font.render(str(self.sketched_values[x][y]), True, sketched_color)
-                    screen.blit(nums, (y * square_size + 5, x * square_size + 5))
+        # Draws the cells whose value, sketch, conflict shading or selection changed since the last
+        # call, and returns their rectangles for pygame.display.update.
+        # The first call draws the whole screen from the baked background, button bar included.
+        cache = render_cache()
+        screen = self.screen
+        dirty = []
+        full = self.full_repaint
+        if full:
+            screen.blit(cache.background, (0, 0))
+            dirty.append(screen.get_rect())
+            self.full_repaint = False
+        selected = -1
+        if self.selected_cell is not None:
+            selected = self.selected_cell[0] * 9 + self.selected_cell[1]
+        values = self.values
+        sketches = self.sketches
+        conflicts = self.conflicts
+        sketch_conflicts = self.sketch_conflicts
+        drawn_values = self.drawn_values
+        drawn_sketches = self.drawn_sketches
+        drawn_flags = self.drawn_flags
+        for index in range(81):
+            flags = 0
+            if index in conflicts:
+                flags = DRAWN_CONFLICT
+            if index in sketch_conflicts:
+                flags |= DRAWN_SKETCH_CONFLICT
+            if index == selected:
+                flags |= DRAWN_SELECTED
+            if (flags != drawn_flags[index] or values[index] != drawn_values[index]
+                    or sketches[index] != drawn_sketches[index]):
+                drawn_values[index] = values[index]
+                drawn_sketches[index] = sketches[index]
+                drawn_flags[index] = flags
+                self.draw_cell(index, values[index], sketches[index], flags, cache)
+                if not full:
+                    dirty.append(cache.squares[index])
+        return dirty
+
+    # Draws one cell from the render cache: its square of the (shaded, for a conflict) background,
+    # then its digit and sketch from the glyph atlas, then the selection outline
+    def draw_cell(self, index, value, sketch, flags, cache):
+        square = cache.squares[index]
+        conflict = flags & DRAWN_CONFLICT
+        background = cache.conflict_background if conflict else cache.background
+        self.screen.blit(background, square, square)
+        if value != 0:
+            cache.atlas.blit(self.screen, "conflict" if conflict else "value", value,
+                             (square.x + 22, square.y + 15))
+        if sketch != 0:
+            cache.atlas.blit(self.screen, "sketch_conflict" if flags & DRAWN_SKETCH_CONFLICT else "sketch",
+                             sketch, (square.x + 5, square.y + 5))
+        if flags & DRAWN_SELECTED:
+            self.cells[index].draw()
+
+    # Makes the next draw repaint the whole screen, for when something else has drawn over it
+    def invalidate(self):
+        self.drawn_flags[:] = STALE_FLAGS
+        self.full_repaint = True
 
     # Defines the select method of the class
     def select(self, row, col):
         # Marks the cell at (row, col) in the board as the current selected cell.
         # Once a cell has been selected, the user can edit its value or sketched value.
-        self.selected_cell = (row, col)
-        cell_value = self.board[self.selected_cell[0]][self.selected_cell[1]]
-        box_selected = Cell(cell_value, self.selected_cell[0], self.selected_cell[1])
-        return box_selected
+        # Returns the cell's view, which is created once and reused afterwards
+        super().select(row, col)
+        if self.cells is None:
+            self.cells = [Cell(self, r, c) for r, c in COORDS]
+        return self.cells[row * 9 + col]
 
     # Defines the click method of the class
     def click(self, x, y):
         # Returns the cell that the user clicks
         row = y // 70
         col = x // 70
-        cell = (row, col)
         self.select(row, col)
-        return cell
-
-    def sketch(self, value):
-        # Sets the sketched value of the current selected cell equal to user entered value.
-        # It will be displayed at the top left corner of the cell using the draw() function.
-        if self.board_list[self.selected_cell[0]][self.selected_cell[1]] == 0:
-            self.sketched_values[self.selected_cell[0]][self.selected_cell[1]] = value
-
-    def place_number(self):
-        # Sets the value of the current selected cell equal to user entered value.
-        # Called when the user presses the Enter key.
-        if self.board_list[self.selected_cell[0]][self.selected_cell[1]] == 0:
-            if self.sketched_values[self.selected_cell[0]][self.selected_cell[1]] != 0:
-                value = self.sketched_values[self.selected_cell[0]][self.selected_cell[1]]
-                self.board[self.selected_cell[0]][self.selected_cell[1]].set_cell_value(value)
-                self.sketched_values[self.selected_cell[0]][self.selected_cell[1]] = 0
-
-    # Resets the board and sketched_values to it's original state
-    def reset_to_original(self):
-        for row in range(len(self.board)):
-            for col in range(len(self.board[row])):
-                self.board[row][col].set_cell_value(self.board_list[row][col])
-                self.sketched_values[row][col] = 0
-
-    # Defines the is_full getter
-    def is_full(self):
-        # Returns True if the board is full, False if else
-        zero_count = 0
-        for x in range(9):
-            for y in range(9):
-                if self.board[x][y].value == 0:
-                    zero_count += 1
-        if zero_count > 0:
-            return False
-        else:
-            return True
-
-    # Defines the check_board method
-    def check_board(self):
-        # is board solved correctly
-        # is each row valid
-        for row in range(9):
-            possible_nums = [1, 2, 3, 4, 5, 6, 7, 8, 9]
-            for col in range(9):
-                try:
-                    possible_nums.remove(self.board[row][col].value)
-                except:
-                    return False
-            if len(possible_nums) > 0:
-                return False
-
-        # is each column valid
-        for col in range(9):
-            possible_nums = [1, 2, 3, 4, 5, 6, 7, 8, 9]
-            for row in range(9):
-                try:
-                    possible_nums.remove(self.board[row][col].value)
-                except:
-                    return False
-            if len(possible_nums) > 0:
-                return False
-
-        # is each box valid
-        # turn the 2d board into a list of boxes
-        list_boxes = [[], [], [], [], [], [], [], [], []]
-        # Iterates through the first box
-        for row in range(0, 3):
-            for col in range(3):
-                list_boxes[0].append(self.board[row][col].value)
-            for col in range(3, 6):
-                list_boxes[1].append(self.board[row][col].value)
-            for col in range(3, 6):
-                list_boxes[2].append(self.board[row][col].value)
-        # Iterates through the second box
-        for row in range(3, 6):
-            for col in range(3):
-                list_boxes[3].append(self.board[row][col].value)
-            for col in range(3, 6):
-                list_boxes[4].append(self.board[row][col].value)
-            for col in range(3, 6):
-                list_boxes[5].append(self.board[row][col].value)
-        # Iterates through the third box
-        for row in range(6, 9):
-            for col in range(3):
-                list_boxes[6].append(self.board[row][col].value)
-            for col in range(3, 6):
-                list_boxes[7].append(self.board[row][col].value)
-            for col in range(3, 6):
-                list_boxes[8].append(self.board[row][col].value)
-        # Checks if the boxes are valid
-        for box in range(9):
-            possible_nums = [1, 2, 3, 4, 5, 6, 7, 8, 9]
-            for num_in_box in range(9):
-                try:
-                    possible_nums.remove(list_boxes[box][num_in_box])
-                except:
-                    return False
-            if len(possible_nums) > 0:
-                return False
-        return True
+        return self.selected_cell
 
 
 # Defines the start_menu method
-def start_menu():
+# inputs is where the events come from, as described in input_replay
+def start_menu(inputs):
     # Sets all screen variables
     welcome = "welcome to sudoku!"
     select_txt = "select game mode:"
     width = 630
     height = 730
-    title_font = pygame.font.SysFont('couriernew', 50)
-    select_font = pygame.font.SysFont('couriernew', 40)
-    button_font = pygame.font.SysFont('couriernew', 20)
+    title_font = get_font('couriernew', 50)
+    select_font = get_font('couriernew', 40)
+    button_font = get_font('couriernew', 20)
     # Fills the screen with the background color
     screen.fill(background_color)
     # Builds welcome text
@@ -240,6 +274,12 @@ def start_menu():
     select_surf = select_font.render(select_txt, True, line_color)
     select_rect = select_surf.get_rect(center=(width // 2, height - 200))
     screen.blit(select_surf, select_rect)
+    # Offers the saved game, if the last one was left unfinished
+    can_resume = os.path.exists(SESSION_PATH)
+    if can_resume:
+        resume_surf = button_font.render("or press R to resume your last game", True, line_color)
+        resume_rect = resume_surf.get_rect(center=(width // 2, height - 20))
+        screen.blit(resume_surf, resume_rect)
     # Builds the easy button
     pygame.draw.rect(screen, line_color, pygame.Rect(70, 580, 130, 60))
     easy_text = "easy"
@@ -260,60 +300,146 @@ def start_menu():
     screen.blit(hard_surf, hard_rect)
     # Updates the display with defined variables
     pygame.display.update()
-    # Creates an event loop
+    # Creates an event loop that sleeps until the next event instead of polling
+    # Returns None if the window is closed before a difficulty is picked, and "resume" for the saved game
+    difficulty = None
     waiting = True
     while waiting:
-        for event in pygame.event.get():
-            if event.type == pygame.MOUSEBUTTONDOWN:  # difficulty selection
-                # Checks which button is clicked
-                x, y = event.pos
-                if (70 <= x <= 200) and (580 <= y <= 640):
-                    difficulty = "easy"
-                    waiting = False
-                elif (250 <= x <= 380) and (580 <= y <= 640):
-                    difficulty = "medium"
-                    waiting = False
-                elif (430 <= x <= 560) and (580 <= y <= 640):
-                    difficulty = "hard"
-                    waiting = False
+        event = inputs.wait()
+        if event.type == pygame.MOUSEBUTTONDOWN:  # difficulty selection
+            # Checks which button is clicked
+            x, y = event.pos
+            if (70 <= x <= 200) and (580 <= y <= 640):
+                difficulty = "easy"
+                waiting = False
+            elif (250 <= x <= 380) and (580 <= y <= 640):
+                difficulty = "medium"
+                waiting = False
+            elif (430 <= x <= 560) and (580 <= y <= 640):
+                difficulty = "hard"
+                waiting = False
+        elif event.type == pygame.KEYDOWN and event.key == pygame.K_r and can_resume:
+            difficulty = "resume"
+            waiting = False
+        elif event.type == pygame.QUIT:
+            waiting = False
     return difficulty
 
 
 # Defines the buttons method
-def buttons():
+def buttons(surface):
+    # Draws the button bar below the board onto surface
     # Sets the button font
-    button_font = pygame.font.SysFont('couriernew', 20)
+    button_font = get_font('couriernew', 20)
     # Builds the reset button
-    pygame.draw.rect(screen, line_color, pygame.Rect(70, 650, 130, 50))
+    pygame.draw.rect(surface, line_color, pygame.Rect(70, 650, 130, 50))
     easy_text = "reset"
     easy_surf = button_font.render(easy_text, True, dark_green)
     easy_rect = easy_surf.get_rect(center=(135, 675))
-    screen.blit(easy_surf, easy_rect)
+    surface.blit(easy_surf, easy_rect)
     # Builds the restart button
-    pygame.draw.rect(screen, line_color, pygame.Rect(250, 650, 130, 50))
+    pygame.draw.rect(surface, line_color, pygame.Rect(250, 650, 130, 50))
     medium_text = "restart"
     medium_surf = button_font.render(medium_text, True, dark_green)
     medium_rect = medium_surf.get_rect(center=(315, 675))
-    screen.blit(medium_surf, medium_rect)
+    surface.blit(medium_surf, medium_rect)
     # Builds the exit button
-    pygame.draw.rect(screen, line_color, pygame.Rect(430, 650, 130, 50))
+    pygame.draw.rect(surface, line_color, pygame.Rect(430, 650, 130, 50))
     hard_text = "exit"
     hard_surf = button_font.render(hard_text, True, dark_green)
     hard_rect = hard_surf.get_rect(center=(495, 675))
-    screen.blit(hard_surf, hard_rect)
+    surface.blit(hard_surf, hard_rect)
+
+
+# Caps how often the game screen is redrawn
+FPS = 60
+# The game in progress is saved here after every move, so it can be resumed from the start menu
+SESSION_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sudoku.session")
+
+
+# Removes the saved game, once it has been finished
+def discard_session():
+    try:
+        os.remove(SESSION_PATH)
+    except OSError:
+        pass
+
+
+# Frame-time HUD, drawn in the strip below the buttons
+HUD_RECT = pygame.Rect(0, 704, 630, 26)
+# Seconds between updates of the HUD text; the numbers are recomputed from the whole ring buffer
+HUD_INTERVAL = 0.5
+
+
+# Shows the frame rate and frame-time percentiles of a FrameTimer
+class Hud:
+    def __init__(self, timer):
+        self.timer = timer
+        self.text = None
+        self.updated = 0.0
+
+    # Draws the HUD onto surface and returns its rectangle, for pygame.display.update
+    def draw(self, surface):
+        now = time.perf_counter()
+        if self.text is None or now - self.updated >= HUD_INTERVAL:
+            stats = self.timer.stats()
+            if stats["total"]["p99"] is None:
+                line = "no frames yet"
+            else:
+                line = "%d fps   frame p50 %.2f ms  p99 %.2f ms   draw p99 %.2f ms" % (
+                    stats["fps"], stats["total"]["p50"], stats["total"]["p99"], stats["draw"]["p99"])
+            self.text = get_font(None, 22).render(line, True, dark_green)
+            self.updated = now
+        surface.blit(render_cache().background, HUD_RECT, HUD_RECT)
+        surface.blit(self.text, (HUD_RECT.x + 6, HUD_RECT.y + 6))
+        return HUD_RECT
+
+
+# Draws the cells of grid that changed, and the HUD when it is shown, and pushes them to the display,
+# marking each phase on timer
+def present(grid, hud, timer):
+    rects = grid.draw()
+    timer.mark("draw")
+    if hud is not None:
+        rects.append(hud.draw(screen))
+        timer.mark("hud")
+    pygame.display.update(rects)
+    timer.mark("update")
 
 
 # Defines the main method
-def main():
+# inputs is a LiveInput, InputRecorder or InputReplay from input_replay, a live one by default
+# Every frame of the game loop is timed into timer (a FrameTimer); hud shows its numbers on screen
+# fps caps how often the board is redrawn, 0 for no cap
+def main(inputs=None, timer=None, hud=False, fps=FPS):
+    clock = pygame.time.Clock()
+    if inputs is None:
+        inputs = LiveInput()
+    if timer is None:
+        timer = FrameTimer()
+    hud = Hud(timer) if hud else None
     # Establishes an overall runtime loop
     up = True
     while up:
         # Defines the required variables
-        difficulty_selection = start_menu()
-        board = generate_sudoku(9, 2)
-        grid = Board(630, 730, None, difficulty_selection)
-        screen.fill(background_color)
+        difficulty_selection = start_menu(inputs)
+        if difficulty_selection is None:
+            break
         current_coord = None
+        box_selected = None
+        if difficulty_selection == "resume":
+            try:
+                puzzle, solution, journal, moves, current_coord = load_session(SESSION_PATH)
+                grid = Board(630, 730, screen, None, (puzzle, solution))
+                grid.replay(journal, moves)
+            except (OSError, ValueError):
+                # An unreadable save is dropped and the menu shown again
+                discard_session()
+                continue
+            if current_coord is not None:
+                box_selected = grid.select(current_coord[0], current_coord[1])
+        else:
+            grid = Board(630, 730, screen, difficulty_selection, inputs.puzzle(difficulty_selection))
 
         GAME_WIN = pygame.USEREVENT + 1
         # custom event, triggers win screen
@@ -322,22 +448,39 @@ def main():
         # Establishes a second runtime loop which keeps the original game data
         running = True
         game_over = False
+        # dirty means the screen no longer matches the game state and must be redrawn
+        dirty = True
         while running:
-            for event in pygame.event.get():
-                # Calls the buttons method
-                buttons()
+            # Draws the board before sleeping whenever it is out of date, so a new or resumed game
+            # shows up at once instead of after the first input event
+            if dirty:
+                timer.start()
+                present(grid, hud, timer)
+                timer.end()
+                dirty = False
+            # Sleeps until at least one event arrives, then handles everything that is queued
+            # so a burst of input only costs one redraw
+            events = [inputs.wait()] + inputs.get()
+            # The frame is timed from here, after the wait
+            timer.start()
+            # placed means a value on the board changed and the board should be checked
+            placed = False
+            # edited means a move was made, undone or redone, or the selection moved, so the session
+            # is saved again
+            edited = False
+            for event in events:
+                # Stops handling input once the game has been left
+                if not running:
+                    break
                 # Checks for mouse button press
                 if event.type == pygame.MOUSEBUTTONDOWN:
-                    pygame.draw.rect(screen, background_color,
-                                     pygame.Rect(0, 0, 630, 630))  # redraws bg without covering buttons
-                    grid.draw()
                     x, y = event.pos
                     # Checks if a game control button is pressed
                     if 0 <= x <= 630 and 630 <= y <= 730:
                         if (70 <= x <= 200) and (650 <= y <= 700):  # Reset button
-                            pygame.draw.rect(screen, background_color, pygame.Rect(0, 0, 630, 630))
                             grid.reset_to_original()
-                            grid.draw()
+                            dirty = True
+                            edited = True
                         elif (250 <= x <= 380) and (650 <= y <= 700):  # Restart button
                             running = False
                         elif (430 <= x <= 560) and (650 <= y <= 700):  # Exit button
@@ -346,114 +489,127 @@ def main():
                     # Establishes the protocol for when a cell is pressed
                     else:
                         current_coord = grid.click(x, y)
-                        cell_value = board[current_coord[0]][current_coord[1]]
-                        box_selected = Cell(cell_value, current_coord[0], current_coord[1])
-                        box_selected.draw()
-                try:  # Tries every way the user can interact with the board
-                    # Checks for a keypress and changes the board accordingly
-                    if event.type == pygame.KEYDOWN:
-                        cell_value = board[current_coord[0]][current_coord[1]]
-                        box_selected = Cell(cell_value, current_coord[0], current_coord[1])
-                        # Checks for left arrow key
-                        if event.key == pygame.K_LEFT:
-                            if current_coord[1] == 0:
-                                box_selected = grid.select((current_coord[0]), (current_coord[1]))
-                            else:
-                                current_coord = ((current_coord[0]), (current_coord[1] - 1))
-                                box_selected = grid.select((current_coord[0]), (current_coord[1]))
-                        # Checks for right arrow key
-                        elif event.key == pygame.K_RIGHT:
-                            try:
-                                current_coord = ((current_coord[0]), (current_coord[1] + 1))
-                                box_selected = grid.select((current_coord[0]), (current_coord[1]))
-                            except IndexError:
-                                current_coord = ((current_coord[0]), (current_coord[1] - 1))
-                                box_selected = grid.select((current_coord[0]), (current_coord[1]))
-                        # Checks for up arrow key
-                        elif event.key == pygame.K_UP:
-                            if current_coord[0] == 0:
-                                box_selected = grid.select((current_coord[0]), (current_coord[1]))
-                            else:
-                                current_coord = ((current_coord[0] - 1), (current_coord[1]))
-                                box_selected = grid.select((current_coord[0]), (current_coord[1]))
-                        # Checks for down arrow key
-                        elif event.key == pygame.K_DOWN:
-                            try:
-                                current_coord = ((current_coord[0] + 1), (current_coord[1]))
-                                box_selected = grid.select((current_coord[0]), (current_coord[1]))
-                            except IndexError:
-                                current_coord = ((current_coord[0] - 1), (current_coord[1]))
-                                box_selected = grid.select((current_coord[0]), (current_coord[1]))
-                        # Next segment checks for number keys for sketching
-                        # Checks for number 1 key
-                        elif event.key == pygame.K_1 or event.key == pygame.K_KP1:
-                            grid.sketch(1)
-                        # Checks for number 2 key
-                        elif event.key == pygame.K_2 or event.key == pygame.K_KP2:
-                            grid.sketch(2)
-                        # Checks for number 3 key
-                        elif event.key == pygame.K_3 or event.key == pygame.K_KP3:
-                            grid.sketch(3)
-                        # Checks for number 4 key
-                        elif event.key == pygame.K_4 or event.key == pygame.K_KP4:
-                            grid.sketch(4)
-                        # Checks for number 5 key
-                        elif event.key == pygame.K_5 or event.key == pygame.K_KP5:
-                            grid.sketch(5)
-                        # Checks for number 6 key
-                        elif event.key == pygame.K_6 or event.key == pygame.K_KP6:
-                            grid.sketch(6)
-                        # Checks for number 7 key
-                        elif event.key == pygame.K_7 or event.key == pygame.K_KP7:
-                            grid.sketch(7)
-                        # Checks for number 8 key
-                        elif event.key == pygame.K_8 or event.key == pygame.K_KP8:
-                            grid.sketch(8)
-                        # Checks for number 9 key
-                        elif event.key == pygame.K_9 or event.key == pygame.K_KP9:
-                            grid.sketch(9)
-                        # Checks if return is pressed, places number
-                        if event.key == pygame.K_RETURN or event.key == pygame.K_KP_ENTER:
-                            pygame.draw.rect(screen, background_color, pygame.Rect(0, 0, 630, 630))
-                            grid.draw()
-                            grid.place_number()
-                            # Updates the screen
-                        pygame.draw.rect(screen, background_color, pygame.Rect(0, 0, 630, 630))
-                        grid.draw()
-                        box_selected.draw()
-                # If TypeError occurs, the program simply looks for the next input
-                except TypeError:
-                    continue
+                        box_selected = grid.select(current_coord[0], current_coord[1])
+                        dirty = True
+                # Ctrl+Z undoes the last move; Ctrl+Y or Ctrl+Shift+Z redoes it
+                # The cell the move changed becomes the selected cell
+                elif (event.type == pygame.KEYDOWN and event.mod & pygame.KMOD_CTRL
+                      and event.key in (pygame.K_z, pygame.K_y)):
+                    if event.key == pygame.K_y or event.mod & pygame.KMOD_SHIFT:
+                        index = grid.redo()
+                    else:
+                        index = grid.undo()
+                    if index is not None:
+                        current_coord = COORDS[index]
+                        box_selected = grid.select(current_coord[0], current_coord[1])
+                        placed = True
+                        edited = True
+                        dirty = True
+                # Checks for a keypress and changes the board accordingly
+                # Keys are ignored until a cell has been selected
+                elif event.type == pygame.KEYDOWN and current_coord is not None:
+                    # Checks for left arrow key
+                    if event.key == pygame.K_LEFT:
+                        if current_coord[1] > 0:
+                            current_coord = ((current_coord[0]), (current_coord[1] - 1))
+                        box_selected = grid.select((current_coord[0]), (current_coord[1]))
+                    # Checks for right arrow key
+                    elif event.key == pygame.K_RIGHT:
+                        if current_coord[1] < 8:
+                            current_coord = ((current_coord[0]), (current_coord[1] + 1))
+                        box_selected = grid.select((current_coord[0]), (current_coord[1]))
+                    # Checks for up arrow key
+                    elif event.key == pygame.K_UP:
+                        if current_coord[0] > 0:
+                            current_coord = ((current_coord[0] - 1), (current_coord[1]))
+                        box_selected = grid.select((current_coord[0]), (current_coord[1]))
+                    # Checks for down arrow key
+                    elif event.key == pygame.K_DOWN:
+                        if current_coord[0] < 8:
+                            current_coord = ((current_coord[0] + 1), (current_coord[1]))
+                        box_selected = grid.select((current_coord[0]), (current_coord[1]))
+                    # Next segment checks for number keys for sketching
+                    # Checks for number 1 key
+                    elif event.key == pygame.K_1 or event.key == pygame.K_KP1:
+                        grid.sketch(1)
+                    # Checks for number 2 key
+                    elif event.key == pygame.K_2 or event.key == pygame.K_KP2:
+                        grid.sketch(2)
+                    # Checks for number 3 key
+                    elif event.key == pygame.K_3 or event.key == pygame.K_KP3:
+                        grid.sketch(3)
+                    # Checks for number 4 key
+                    elif event.key == pygame.K_4 or event.key == pygame.K_KP4:
+                        grid.sketch(4)
+                    # Checks for number 5 key
+                    elif event.key == pygame.K_5 or event.key == pygame.K_KP5:
+                        grid.sketch(5)
+                    # Checks for number 6 key
+                    elif event.key == pygame.K_6 or event.key == pygame.K_KP6:
+                        grid.sketch(6)
+                    # Checks for number 7 key
+                    elif event.key == pygame.K_7 or event.key == pygame.K_KP7:
+                        grid.sketch(7)
+                    # Checks for number 8 key
+                    elif event.key == pygame.K_8 or event.key == pygame.K_KP8:
+                        grid.sketch(8)
+                    # Checks for number 9 key
+                    elif event.key == pygame.K_9 or event.key == pygame.K_KP9:
+                        grid.sketch(9)
+                    # Checks if return is pressed, places number
+                    elif event.key == pygame.K_RETURN or event.key == pygame.K_KP_ENTER:
+                        grid.place_number()
+                        placed = True
+                    dirty = True
+                    edited = True
                 # Checks if the user closed the program
-                if event.type == pygame.QUIT:
-                    pygame.quit()
+                elif event.type == pygame.QUIT:
                     running = False
                     up = False
                 # quits game event loop and sets win to false
-                if event.type == GAME_LOSS:
+                elif event.type == GAME_LOSS:
                     win = False
                     game_over = True
                     break
                 # quits game event loop and sets win to true
-                if event.type == GAME_WIN:
+                elif event.type == GAME_WIN:
                     win = True
                     game_over = True
                     break
-            grid.draw()
+            timer.mark("events")
+            if not running:
+                break
 
-            # checks whether to post gamewin or gameloss event when the board is full
-            if grid.is_full():
-                if not grid.check_board():
-                    pygame.event.post(pygame.event.Event(GAME_LOSS))
+            # Saves the session after every move, so closing the window never loses the game
+            if edited:
+                save_session(SESSION_PATH, grid)
+            timer.mark("save")
+
+            # checks whether to post gamewin or gameloss event, only after a number was placed
+            if placed and grid.is_full():
                 if grid.check_board():
                     pygame.event.post(pygame.event.Event(GAME_WIN))
+                else:
+                    pygame.event.post(pygame.event.Event(GAME_LOSS))
+            timer.mark("check")
+
+            # Redraws only the cells that changed, and only pushes those to the display, then waits
+            # out the rest of the frame, which no phase of the frame counts
+            if dirty and not game_over:
+                present(grid, hud, timer)
+                dirty = False
+                timer.end()
+                clock.tick(fps)
+            else:
+                timer.end()
 
             # end window
             if game_over:
+                discard_session()
                 # Sets screen variables
-                end_font = pygame.font.SysFont('impact', 75)
-                exit_font = pygame.font.SysFont('impact', 30)
-                play_again_font = pygame.font.SysFont('impact', 20)
+                end_font = get_font('impact', 75)
+                exit_font = get_font('impact', 30)
+                play_again_font = get_font('impact', 20)
                 screen.fill(background_color)
                 # Checks if win and sets win screen
                 if win:
@@ -475,38 +631,76 @@ def main():
                 screen.blit(surf, rect_end)
                 # Updates the screen
                 pygame.display.update()
-                # event loop for end window
+                # event loop for end window, sleeping until each event arrives
                 waiting = True
                 while waiting:
-                    for event in pygame.event.get():
-                        if event.type == pygame.MOUSEBUTTONDOWN:
-                            # Checks if user clicks the button
-                            x, y = event.pos
-                            if 185 < x < 315 and 360 > y > 240:
-                                # If win, the button will be a quit button
-                                if win:
-                                    pygame.quit()
-                                    waiting = False
-                                    up = False
-                                # If loss, the button will be a try again button, which recursively runs the program again
-                                else:
-                                    main()
-
-                        # closes window
-                        if event.type == pygame.QUIT:
-                            pygame.quit()
+                    event = inputs.wait()
+                    if event.type == pygame.MOUSEBUTTONDOWN:
+                        # Checks if user clicks the button
+                        x, y = event.pos
+                        if 185 < x < 315 and 360 > y > 240:
+                            # If win, the button will be a quit button
+                            if win:
+                                up = False
+                            # If loss, the button will be a try again button, which goes back to the start menu
+                            waiting = False
                             running = False
-                            up = False
-            # Updates the screen
-            pygame.display.update()
+                    # closes window
+                    elif event.type == pygame.QUIT:
+                        waiting = False
+                        running = False
+                        up = False
+    inputs.close()
+    pygame.quit()
 
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Play Sudoku")
+    parser.add_argument("--hud", action="store_true", help="show the frame rate and frame times on screen")
+    parser.add_argument("--frame-log", metavar="FILE", help="write the recent frame times here on exit, as JSON lines")
+    parser.add_argument("--record", metavar="FILE", help="record the input and puzzles of this session")
+    parser.add_argument("--replay", metavar="FILE", help="play back a recorded session instead of reading input")
+    parser.add_argument("--realtime", action="store_true",
+                        help="with --replay, keep the recorded timing instead of replaying as fast as possible")
+    parser.add_argument("--headless", action="store_true", help="run without a window, on SDL's dummy video driver")
+    args = parser.parse_args()
+    if args.headless:
+        os.environ["SDL_VIDEODRIVER"] = "dummy"
+    inputs = None
+    replay_dir = None
+    if args.replay:
+        inputs = InputReplay(args.replay, args.realtime)
+        # The replay saves its moves in a scratch session file, starting from the game that was saved
+        # when the recording began, so it can resume the same game and leaves the real save alone
+        replay_dir = tempfile.mkdtemp(prefix="sudoku-replay-")
+        SESSION_PATH = os.path.join(replay_dir, "sudoku.session")
+        if inputs.session is not None:
+            with open(SESSION_PATH, "wb") as file:
+                file.write(inputs.session)
+    elif args.record:
+        inputs = InputRecorder(args.record, SESSION_PATH)
+    timer = FrameTimer()
     # Initializes pygame variables
     pygame.init()
     screen = pygame.display.set_mode((630, 730))
     pygame.display.set_caption("sudoku")
-    icon = pygame.image.load('sudoku.png')
-    pygame.display.set_icon(icon)
+    # The window icon is optional, so the game also starts from a checkout without it
+    icon_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sudoku.png")
+    if os.path.exists(icon_path):
+        pygame.display.set_icon(pygame.image.load(icon_path))
     # Calls the main method
-    main()
+    started = time.perf_counter()
+    try:
+        main(inputs, timer, args.hud, 0 if args.replay and not args.realtime else FPS)
+    finally:
+        if replay_dir is not None:
+            shutil.rmtree(replay_dir, ignore_errors=True)
+    if args.frame_log:
+        timer.dump(args.frame_log)
+    if args.replay:
+        stats = timer.stats()
+        print("replayed %d frames in %.2f s" % (stats["frames"], time.perf_counter() - started))
+        for name in ("total",) + PHASES:
+            if stats[name]["p50"] is not None:
+                print("%-7s p50 %.3f ms  p99 %.3f ms  max %.3f ms" % (
+                    name, stats[name]["p50"], stats[name]["p99"], stats[name]["max"]))
@@ -0,0 +1,155 @@
+import random
+
+import numpy as np
+
+from sudoku_board import UNITS
+from sudoku_generator import SudokuGenerator
+
+# Fills whole batches of 9x9 grids in lockstep with NumPy. Every board in the batch is a row of an
+# (N, 81) array, and every pass of the loop works on all unfinished boards at once:
+#   1. candidate masks (bit d set when digit d is still possible) are rebuilt from the placed digits
+#      with a few OR-reductions over the 27 units
+#   2. boards with a repeated digit or a cell without candidates are dead
+#   3. every naked single on every live board is placed
+#   4. boards without a single branch on their most constrained cell with a random candidate,
+#      saving a snapshot first
+# A dead board goes back to its last snapshot with the digit it tried ruled out there; if it has no
+# snapshot left, it starts over. The rare board that fails max_restarts times is filled by
+# SudokuGenerator, which backtracks as deep as it needs to.
+
+ALL_DIGITS = 0b1111111110
+# (27, 9) cells of every unit, and (81, 3) the row, column and box unit of every cell
+UNIT_CELLS = np.array(UNITS)
+CELL_UNITS = np.array([[unit for unit in range(27) if index in UNITS[unit]] for index in range(81)])
+DIAGONAL_BOXES = [UNITS[18], UNITS[22], UNITS[26]]
+# Lookup tables over 10-bit candidate masks
+POPCOUNT = np.array([bin(mask).count("1") for mask in range(1 << 10)], dtype=np.uint8)
+LOWEST_DIGIT = np.array([(mask & -mask).bit_length() - 1 if mask else 0 for mask in range(1 << 10)],
+                        dtype=np.uint8)
+DIGIT_BITS = (1 << np.arange(10, dtype=np.uint16))
+
+
+# ORs an array together along its last (short) axis
+# Slicing and OR-ing pairwise is several times faster than np.bitwise_or.reduce over a short axis
+def or_last_axis(array):
+    result = array[..., 0].copy()
+    for position in range(1, array.shape[-1]):
+        result |= array[..., position]
+    return result
+
+
+# Fills the three diagonal boxes of the given boards with random permutations of 1-9
+def fill_diagonal(values, boards, rng):
+    for cells in DIAGONAL_BOXES:
+        digits = np.tile(np.arange(1, 10, dtype=np.uint8), (len(boards), 1))
+        values[np.ix_(boards, cells)] = rng.permuted(digits, axis=1)
+
+
+# Returns an (count, 9, 9) uint8 array of randomly filled, valid grids
+# rng is a numpy Generator or a seed for one
+def fill_grids(count, rng=None, max_restarts=20):
+    rng = np.random.default_rng(rng)
+    values = np.zeros((count, 81), dtype=np.uint8)
+    fill_diagonal(values, np.arange(count), rng)
+    # Digits ruled out by failed branches, kept as candidate masks
+    excluded = np.zeros((count, 81), dtype=np.uint16)
+    snapshot = np.zeros((count, 81), dtype=np.uint8)
+    has_snapshot = np.zeros(count, dtype=bool)
+    branch_cell = np.zeros(count, dtype=np.intp)
+    branch_digit = np.zeros(count, dtype=np.uint8)
+    restarts = np.zeros(count, dtype=np.intp)
+    fallback = []
+    active = np.arange(count)
+    while active.size:
+        current = values[active]
+        bits = DIGIT_BITS[current]
+        bits[current == 0] = 0
+        unit_bits = bits[:, UNIT_CELLS]
+        unit_used = or_last_axis(unit_bits)
+        # Distinct powers of two sum to their OR, so a difference means a repeated digit
+        repeated = (unit_bits.sum(axis=2, dtype=np.uint32) != unit_used).any(axis=1)
+        used = or_last_axis(unit_used[:, CELL_UNITS])
+        empty = current == 0
+        candidates = np.where(empty, ALL_DIGITS & ~used & ~excluded[active], 0).astype(np.uint16)
+        sizes = POPCOUNT[candidates]
+        dead = repeated | (empty & (sizes == 0)).any(axis=1)
+        complete = ~dead & ~empty.any(axis=1)
+        singles = empty & (sizes == 1) & ~dead[:, np.newaxis]
+        has_single = singles.any(axis=1)
+        stuck = ~dead & ~complete & ~has_single
+
+        # Places every naked single
+        current[singles] = LOWEST_DIGIT[candidates[singles]]
+
+        # Branches the stuck boards on their most constrained cell
+        if stuck.any():
+            rows = np.flatnonzero(stuck)
+            boards = active[rows]
+            open_sizes = np.where(empty[rows], sizes[rows], 10)
+            cells = open_sizes.argmin(axis=1)
+            masks = candidates[rows, cells]
+            # Picks a random candidate: the highest random score among the set bits
+            scores = rng.random((rows.size, 10)) * ((masks[:, np.newaxis] & DIGIT_BITS) != 0)
+            digits = scores.argmax(axis=1).astype(np.uint8)
+            snapshot[boards] = current[rows]
+            has_snapshot[boards] = True
+            branch_cell[boards] = cells
+            branch_digit[boards] = digits
+            current[rows, cells] = digits
+
+        values[active] = current
+
+        # Dead boards return to their snapshot with the failed digit ruled out, or start over
+        if dead.any():
+            boards = active[dead]
+            with_snapshot = has_snapshot[boards]
+            retry = boards[with_snapshot]
+            values[retry] = snapshot[retry]
+            excluded[retry, branch_cell[retry]] |= DIGIT_BITS[branch_digit[retry]]
+            has_snapshot[retry] = False
+            restart = boards[~with_snapshot]
+            if restart.size:
+                restarts[restart] += 1
+                values[restart] = 0
+                excluded[restart] = 0
+                fill_diagonal(values, restart, rng)
+                fallback.extend(restart[restarts[restart] > max_restarts].tolist())
+
+        keep = ~complete
+        if fallback:
+            keep &= ~np.isin(active, fallback)
+        active = active[keep]
+
+    # Boards that kept failing are filled one at a time by the backtracking generator
+    for board in fallback:
+        sudoku = SudokuGenerator(9, 0, rng=random.Random(int(rng.integers(1 << 63))))
+        sudoku.fill_values()
+        values[board] = np.array(sudoku.get_board(), dtype=np.uint8).reshape(81)
+    return values.reshape(count, 9, 9)
+
+
+# Generates count puzzles with removed empty cells each, like count calls to generate_sudoku
+# Grids are filled by fill_grids. Cells are then removed at random with one vectorized step, or,
+# with unique=True, by SudokuGenerator.remove_cells one board at a time, which keeps the solution
+# unique but is much slower than the filling.
+# Returns a list of boards (lists of rows), or a (count, 9, 9) uint8 array with arrays=True; with
+# solutions=True, returns (puzzles, solutions) in the same format.
+def generate_batch(count, removed, unique=False, seed=None, arrays=False, solutions=False):
+    rng = np.random.default_rng(seed)
+    grids = fill_grids(count, rng)
+    if unique:
+        puzzles = np.empty_like(grids)
+        for board in range(count):
+            sudoku = SudokuGenerator(9, removed, True, random.Random(int(rng.integers(1 << 63))))
+            sudoku.load_board(grids[board].tolist())
+            sudoku.remove_cells()
+            puzzles[board] = sudoku.get_board()
+    else:
+        puzzles = grids.reshape(count, 81).copy()
+        cut = rng.random((count, 81)).argsort(axis=1)[:, :removed]
+        np.put_along_axis(puzzles, cut, 0, axis=1)
+        puzzles = puzzles.reshape(count, 9, 9)
+    if not arrays:
+        puzzles = puzzles.tolist()
+        grids = grids.tolist()
+    return (puzzles, grids) if solutions else puzzles
@@ -0,0 +1,307 @@
+import os
+import struct
+
+# Board state shared by the game and the headless tools. Nothing in here imports pygame.
+
+unit_tables_cache = {}
+
+
+# Returns precomputed (box of each cell, units, peers) lookups for a size x size board, with cells
+# indexed by row * size + col. units lists the rows, then the columns, then the boxes, as lists of
+# cell indices; peers[index] holds the cells that share a row, column or box with index, excluding
+# index itself (20 of them on a 9x9 board). Tables are built once per size and shared.
+def unit_tables(size):
+    if size not in unit_tables_cache:
+        box_length = int(round(size ** 0.5))
+        box_of = [(index // size // box_length) * box_length + index % size // box_length
+                  for index in range(size * size)]
+        units = ([[row * size + col for col in range(size)] for row in range(size)] +
+                 [[row * size + col for row in range(size)] for col in range(size)] +
+                 [[index for index in range(size * size) if box_of[index] == box] for box in range(size)])
+        peers = [set() for index in range(size * size)]
+        for unit in units:
+            for index in unit:
+                peers[index].update(unit)
+        peers = [sorted(peers[index] - {index}) for index in range(size * size)]
+        unit_tables_cache[size] = (box_of, units, peers)
+    return unit_tables_cache[size]
+
+
+# Precomputed per-cell lookups for the flat 81-cell buffers, indexed by row * 9 + col
+COORDS = [(index // 9, index % 9) for index in range(81)]
+BOX_OF, UNITS, PEERS = unit_tables(9)
+# Offsets of the row, column and box digit counters of every cell inside BoardState.counts
+UNIT_OFFSETS = [(row * 10, 90 + col * 10, 180 + BOX_OF[row * 9 + col] * 10) for row, col in COORDS]
+EMPTY_CELLS = bytes(81)
+
+# Moves are journaled as 3-byte (cell, old, new) records. The cell byte has JOURNAL_SKETCH set for a
+# sketch; otherwise the record is a placement, which also moved the cell's sketch (new) into its value.
+JOURNAL_SKETCH = 0x80
+JOURNAL_CELL = 0x7F
+
+# Saved sessions: a header, the givens, the solution (when the header says there is one) and the
+# journal, which is replayed up to the saved position on load
+#   header  SESSION_MAGIC, version (uint8), has solution (uint8), selected cell (uint8, 255 for none),
+#           moves applied (uint32), little-endian
+SESSION_MAGIC = b"SDKS"
+SESSION_VERSION = 1
+SESSION_HEADER = struct.Struct("<4sBBBI")
+NO_SELECTION = 255
+
+# Characters used to write a board as a single line, one character per cell, 0 for an empty cell
+# Boards larger than 9x9 continue with letters, so 16x16 uses 1-9 then A-G
+DIGITS = "0123456789ABCDEFGHIJKLMNOP"
+
+
+# Writes a square board (a list of rows) as one line of text, row by row
+def board_to_string(board):
+    return "".join(DIGITS[value] for row in board for value in row)
+
+
+# Reads a line written by board_to_string back into a list of rows; '.' also marks an empty cell
+# Raises ValueError if the line is not a square board of a supported size
+def string_to_board(text):
+    text = text.strip()
+    size = int(round(len(text) ** 0.5))
+    if size * size != len(text) or int(round(size ** 0.5)) ** 2 != size or size >= len(DIGITS):
+        raise ValueError("expected a square board of 16, 81, 256 or 625 cells, got %d characters" % len(text))
+    values = []
+    for char in text.upper():
+        value = 0 if char == "." else DIGITS.find(char)
+        if not 0 <= value <= size:
+            raise ValueError("invalid cell %r in a %dx%d board" % (char, size, size))
+        values.append(value)
+    return [values[row * size:row * size + size] for row in range(size)]
+
+
+# Holds the state of a 9x9 game as flat 81-byte buffers in row-major order: the givens, the current
+# values and the sketched values, plus running totals that answer is_full and check_board in O(1)
+# and sets of the conflicting cells, which each change keeps up to date by looking at 20 peers
+class BoardState:
+    # puzzle is a list of 9 rows with 0 for empty cells; solution is optional
+    def __init__(self, puzzle, solution=None):
+        self.givens = bytes(value for row in puzzle for value in row)
+        self.solution = bytes(value for row in solution for value in row) if solution is not None else None
+        self.values = bytearray(81)
+        self.sketches = bytearray(81)
+        self.selected_cell = None
+        # Running totals: how many cells are filled, how often each digit occurs in every row,
+        # column and box (counts[unit * 10 + digit], rows first, then columns, then boxes),
+        # and how many repeated digits there are across all of those units
+        self.filled = 0
+        self.counts = bytearray(270)
+        self.duplicates = 0
+        # Cells whose value is repeated in their row, column or box, and cells whose sketched
+        # value is already placed there
+        self.conflicts = set()
+        self.sketch_conflicts = set()
+        for row, col in COORDS:
+            self.set_value(row, col, self.givens[row * 9 + col])
+        # Snapshot of the starting totals, so a reset is a few buffer copies
+        self.given_counts = bytes(self.counts)
+        self.given_filled = self.filled
+        self.given_duplicates = self.duplicates
+        self.given_conflicts = frozenset(self.conflicts)
+        # Move journal and how many of its moves are applied; the rest can be redone
+        self.journal = bytearray()
+        self.moves = 0
+
+    # Marks the cell at (row, col) as the current selected cell
+    def select(self, row, col):
+        self.selected_cell = COORDS[row * 9 + col]
+
+    def sketch(self, value):
+        # Sets the sketched value of the current selected cell equal to user entered value.
+        index = self.selected_cell[0] * 9 + self.selected_cell[1]
+        if self.givens[index] == 0 and self.sketches[index] != value:
+            self.record(index | JOURNAL_SKETCH, self.sketches[index], value)
+            self.set_sketch(index, value)
+
+    def place_number(self):
+        # Sets the value of the current selected cell equal to its sketched value.
+        index = self.selected_cell[0] * 9 + self.selected_cell[1]
+        if self.givens[index] == 0:
+            if self.sketches[index] != 0:
+                self.record(index, self.values[index], self.sketches[index])
+                self.set_value(self.selected_cell[0], self.selected_cell[1], self.sketches[index])
+                self.set_sketch(index, 0)
+
+    # Changes the sketched value of a cell without journaling it
+    def set_sketch(self, index, value):
+        self.sketches[index] = value
+        self.update_conflicts(index)
+
+    # Appends a move to the journal, dropping the moves that were undone before it
+    def record(self, cell, old, new):
+        del self.journal[self.moves * 3:]
+        self.journal += bytes((cell, old, new))
+        self.moves += 1
+
+    # Undoes the last applied move; returns the index of the cell it changed, or None if there is none
+    def undo(self):
+        if self.moves == 0:
+            return None
+        self.moves -= 1
+        cell, old, new = self.journal[self.moves * 3:self.moves * 3 + 3]
+        index = cell & JOURNAL_CELL
+        if cell & JOURNAL_SKETCH:
+            self.set_sketch(index, old)
+        else:
+            self.set_value(index // 9, index % 9, old)
+            self.set_sketch(index, new)
+        return index
+
+    # Applies the next undone move again; returns the index of the cell it changed, or None
+    def redo(self):
+        if self.moves * 3 >= len(self.journal):
+            return None
+        cell, old, new = self.journal[self.moves * 3:self.moves * 3 + 3]
+        self.moves += 1
+        index = cell & JOURNAL_CELL
+        if cell & JOURNAL_SKETCH:
+            self.set_sketch(index, new)
+        else:
+            self.set_value(index // 9, index % 9, new)
+            self.set_sketch(index, 0)
+        return index
+
+    # Loads a journal and applies its first moves moves, as when a saved session is restored
+    # Raises ValueError if a record does not fit this board
+    def replay(self, journal, moves):
+        if len(journal) % 3 or not 0 <= moves <= len(journal) // 3:
+            raise ValueError("journal of %d bytes cannot hold %d moves" % (len(journal), moves))
+        for offset in range(0, len(journal), 3):
+            cell, old, new = journal[offset:offset + 3]
+            index = cell & JOURNAL_CELL
+            if index >= 81 or old > 9 or new > 9 or self.givens[index] != 0:
+                raise ValueError("invalid journal record %d" % (offset // 3))
+        self.reset_to_original()
+        self.journal = bytearray(journal)
+        for move in range(moves):
+            self.redo()
+
+    # Returns the session as bytes: the givens, the solution, the selection and the journal
+    def session_bytes(self):
+        selected = NO_SELECTION if self.selected_cell is None else self.selected_cell[0] * 9 + self.selected_cell[1]
+        header = SESSION_HEADER.pack(SESSION_MAGIC, SESSION_VERSION, self.solution is not None, selected, self.moves)
+        return b"".join((header, self.givens, self.solution or b"", self.journal))
+
+    # Changes the value of the cell at (row, col) and updates the running totals to match
+    def set_value(self, row, col, value):
+        index = row * 9 + col
+        old = self.values[index]
+        if old == value:
+            return
+        counts = self.counts
+        if old != 0:
+            self.filled -= 1
+            for unit in UNIT_OFFSETS[index]:
+                counts[unit + old] -= 1
+                if counts[unit + old] >= 1:
+                    self.duplicates -= 1
+        if value != 0:
+            self.filled += 1
+            for unit in UNIT_OFFSETS[index]:
+                if counts[unit + value] >= 1:
+                    self.duplicates += 1
+                counts[unit + value] += 1
+        self.values[index] = value
+        # Only peers holding or sketching the old or the new digit can change state
+        changed = (1 << old | 1 << value) & ~1
+        values = self.values
+        sketches = self.sketches
+        for peer in PEERS[index]:
+            if changed >> values[peer] & 1 or changed >> sketches[peer] & 1:
+                self.update_conflicts(peer)
+        self.update_conflicts(index)
+
+    # Rechecks whether the value and the sketch of a cell repeat a digit in its row, column or box,
+    # using the digit counters, and updates conflicts and sketch_conflicts to match
+    def update_conflicts(self, index):
+        counts = self.counts
+        row, col, box = UNIT_OFFSETS[index]
+        value = self.values[index]
+        if value and (counts[row + value] > 1 or counts[col + value] > 1 or counts[box + value] > 1):
+            self.conflicts.add(index)
+        else:
+            self.conflicts.discard(index)
+        sketch = self.sketches[index]
+        # The cell's own value is in the counters too, so a sketch equal to it needs a second copy
+        limit = 1 if sketch == value else 0
+        if sketch and (counts[row + sketch] > limit or counts[col + sketch] > limit or counts[box + sketch] > limit):
+            self.sketch_conflicts.add(index)
+        else:
+            self.sketch_conflicts.discard(index)
+
+    # Resets the board and sketched values to it's original state with a few buffer copies
+    # This rewinds the journal to its start, so every move can still be redone
+    def reset_to_original(self):
+        self.values[:] = self.givens
+        self.sketches[:] = EMPTY_CELLS
+        self.counts[:] = self.given_counts
+        self.filled = self.given_filled
+        self.duplicates = self.given_duplicates
+        self.conflicts = set(self.given_conflicts)
+        self.sketch_conflicts.clear()
+        self.moves = 0
+
+    # Returns True if the board is full, False if else
+    def is_full(self):
+        return self.filled == 81
+
+    # is board solved correctly: the full board equals the stored solution, which is the only one,
+    # as the game's puzzles are all generated with a unique solution. Without a stored solution, a
+    # full board with no repeated digit in any row, column or box holds 1-9 exactly once in each
+    def check_board(self):
+        if self.filled != 81:
+            return False
+        if self.solution is not None:
+            return self.values == self.solution
+        return self.duplicates == 0
+
+    # Returns True if no digit is repeated in any row, column or box, whether or not the board is full
+    def is_consistent(self):
+        return self.duplicates == 0
+
+    # Returns the current values as a list of 9 rows
+    def get_board(self):
+        return [list(self.values[row * 9:row * 9 + 9]) for row in range(9)]
+
+
+# Reads bytes written by BoardState.session_bytes
+# Returns (puzzle, solution, journal, moves, selected cell), with the boards as lists of rows, the
+# solution None if none was saved and the selected cell a (row, col) pair or None
+# Raises ValueError if the data is not a session
+def read_session(data):
+    if len(data) < SESSION_HEADER.size:
+        raise ValueError("session is truncated")
+    magic, version, has_solution, selected, moves = SESSION_HEADER.unpack_from(data, 0)
+    if magic != SESSION_MAGIC or version != SESSION_VERSION:
+        raise ValueError("not a saved session")
+    offset = SESSION_HEADER.size
+    boards = []
+    for board in range(2 if has_solution else 1):
+        cells = data[offset:offset + 81]
+        if len(cells) != 81 or max(cells) > 9:
+            raise ValueError("session is truncated")
+        boards.append([list(cells[row * 9:row * 9 + 9]) for row in range(9)])
+        offset += 81
+    solution = boards[1] if has_solution else None
+    if selected != NO_SELECTION and selected >= 81:
+        raise ValueError("invalid selected cell %d" % selected)
+    selected = None if selected == NO_SELECTION else COORDS[selected]
+    return boards[0], solution, bytes(data[offset:]), moves, selected
+
+
+# Writes a session to path, replacing any previous one in a single rename
+def save_session(path, state):
+    temporary = path + ".tmp"
+    with open(temporary, "wb") as file:
+        file.write(state.session_bytes())
+    os.replace(temporary, path)
+
+
+# Reads a session saved by save_session and returns it like read_session
+def load_session(path):
+    with open(path, "rb") as file:
+        return read_session(file.read())
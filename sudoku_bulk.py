@@ -0,0 +1,231 @@
+import argparse
+import os
+import random
+import sys
+import time
+from collections import deque
+from itertools import islice
+
+from sudoku_board import board_to_string, string_to_board
+from sudoku_generator import SudokuGenerator, solve_sudoku
+from sudoku_validator import board_stack, validate_boards, validate_givens
+
+# Streams large puzzle files through the solver, validator or solution counter on a process pool:
+#   python sudoku_bulk.py solve puzzles.txt -o solutions.txt --workers 4
+#   python sudoku_bulk.py validate - < boards.txt
+#   python sudoku_bulk.py count puzzles.txt -o counts.txt --resume
+#
+# Input is one board per line in the sudoku_cli format, and every input line gets exactly one output
+# line, in input order (blank lines stay blank, unreadable lines get "error: ..."). Lines are read in
+# chunks and at most two chunks per worker are in flight, so memory stays bounded however long the
+# input is. Output is flushed a chunk at a time, which is what --resume relies on: it counts the lines
+# already in the output file and skips that many input lines.
+
+
+# Returns the verdict for one board, as printed by validate:
+#   solved      - every cell is filled and no row, column or box repeats a digit
+#   valid       - some cells are empty, but no row, column or box repeats a digit
+#   invalid     - some row, column or box repeats a digit
+# With unique, a valid board is reported as unique, multiple or unsolvable instead
+# The boards are checked together with sudoku_validator, one numpy stack per board size; only the
+# solution count for unique needs a search per board
+def board_verdicts(boards, unique=False):
+    verdicts = [None] * len(boards)
+    sizes = {}
+    for position, board in enumerate(boards):
+        sizes.setdefault(len(board), []).append(position)
+    for positions in sizes.values():
+        stack = board_stack([boards[position] for position in positions])
+        solved = validate_boards(stack)
+        valid = validate_givens(stack)
+        for position, is_solved, is_valid in zip(positions, solved.tolist(), valid.tolist()):
+            if is_solved:
+                verdicts[position] = "solved"
+            elif not is_valid:
+                verdicts[position] = "invalid"
+            elif unique:
+                sudoku = SudokuGenerator(len(boards[position]), 0)
+                sudoku.load_board(boards[position])
+                verdicts[position] = ("unsolvable", "unique", "multiple")[sudoku.count_solutions(2)]
+            else:
+                verdicts[position] = "valid"
+    return verdicts
+
+
+def board_verdict(board, unique=False):
+    return board_verdicts([board], unique)[0]
+
+
+# Returns the output line for every board: its solution or "unsolvable"
+# Every board gets a freshly seeded generator, so a puzzle with several solutions always gets the same
+# one, whichever worker and chunk it lands in
+def solve_boards(boards, options):
+    results = []
+    for board in boards:
+        solution = solve_sudoku(board, random.Random(0))
+        results.append("unsolvable" if solution is None else board_to_string(solution))
+    return results
+
+
+def validate_chunk(boards, options):
+    return board_verdicts(boards, options.get("unique", False))
+
+
+# Returns the number of solutions of every board, or "<limit>+" once the count reaches the limit
+def count_boards(boards, options):
+    limit = options.get("limit", 2)
+    results = []
+    for board in boards:
+        sudoku = SudokuGenerator(len(board), 0)
+        if not sudoku.load_board(board):
+            results.append("0")
+            continue
+        count = sudoku.count_solutions(limit)
+        results.append("%d+" % count if count >= limit else str(count))
+    return results
+
+
+# Every mode takes the readable boards of a chunk at once and returns their output lines
+MODES = {"solve": solve_boards, "validate": validate_chunk, "count": count_boards}
+
+
+# Processes one chunk of input lines in a worker and returns their output lines
+def process_chunk(task):
+    mode, options, lines = task
+    results = []
+    boards = []
+    positions = []
+    for line in lines:
+        line = line.strip()
+        if not line:
+            results.append("")
+            continue
+        try:
+            boards.append(string_to_board(line))
+        except ValueError as error:
+            results.append("error: %s" % error)
+            continue
+        positions.append(len(results))
+        results.append(None)
+    for position, result in zip(positions, MODES[mode](boards, options)):
+        results[position] = result
+    return results
+
+
+# Yields the input lines in lists of chunk_size
+def read_chunks(lines, chunk_size):
+    lines = iter(lines)
+    while True:
+        chunk = list(islice(lines, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+# Processes every line and yields the output lines chunk by chunk, in input order
+# workers=1 runs in this process; otherwise at most two chunks per worker are queued at once.
+def process_lines(lines, mode, options=None, workers=None, chunk_size=1000):
+    options = options or {}
+    chunks = read_chunks(lines, chunk_size)
+    if workers == 1:
+        for chunk in chunks:
+            yield process_chunk((mode, options, chunk))
+        return
+    # Imported here so that importing this module stays fast
+    import multiprocessing
+    with multiprocessing.Pool(workers) as pool:
+        window = (workers or os.cpu_count() or 1) * 2
+        pending = deque()
+        for chunk in chunks:
+            pending.append(pool.apply_async(process_chunk, ((mode, options, chunk),)))
+            if len(pending) >= window:
+                yield pending.popleft().get()
+        while pending:
+            yield pending.popleft().get()
+
+
+# Returns how many complete lines an existing output file holds, cutting off a partly written last
+# line so that writing can continue from there
+def completed_lines(path):
+    if not os.path.exists(path):
+        return 0
+    count = 0
+    end = 0
+    position = 0
+    with open(path, "rb") as file:
+        while True:
+            block = file.read(1 << 20)
+            if not block:
+                break
+            newlines = block.count(b"\n")
+            if newlines:
+                count += newlines
+                end = position + block.rindex(b"\n") + 1
+            position += len(block)
+    if end != position:
+        with open(path, "r+b") as file:
+            file.truncate(end)
+    return count
+
+
+def run(args):
+    options = {"unique": args.unique, "limit": args.limit}
+    source = sys.stdin if args.input == "-" else open(args.input)
+    skipped = 0
+    if args.resume:
+        if not args.output:
+            raise ValueError("--resume needs --output")
+        skipped = completed_lines(args.output)
+        for line in islice(source, skipped):
+            pass
+    out = open(args.output, "a" if args.resume else "w") if args.output else sys.stdout
+    start = time.perf_counter()
+    reported = start
+    done = 0
+    try:
+        for results in process_lines(source, args.mode, options, args.workers, args.chunk_size):
+            out.write("\n".join(results) + "\n")
+            out.flush()
+            done += len(results)
+            now = time.perf_counter()
+            if args.progress and now - reported >= args.progress:
+                reported = now
+                sys.stderr.write("%d boards, %.0f boards/s\n" % (skipped + done, done / (now - start)))
+    except KeyboardInterrupt:
+        sys.stderr.write("interrupted after %d boards%s\n" % (
+            skipped + done, ", run again with --resume to continue" if args.output else ""))
+        return 130
+    finally:
+        if out is not sys.stdout:
+            out.close()
+        if source is not sys.stdin:
+            source.close()
+    elapsed = time.perf_counter() - start
+    sys.stderr.write("%s: %d boards in %.2f s, %.0f boards/s%s\n" % (
+        args.mode, done, elapsed, done / elapsed if elapsed else 0,
+        ", resumed after %d" % skipped if skipped else ""))
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Solve, validate or count the solutions of many boards")
+    parser.add_argument("mode", choices=list(MODES))
+    parser.add_argument("input", help="file with one board per line, or - for stdin")
+    parser.add_argument("-o", "--output", help="write results here instead of stdout")
+    parser.add_argument("--workers", type=int, help="worker processes, one per CPU by default; 1 for none")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="boards per worker task")
+    parser.add_argument("--resume", action="store_true",
+                        help="continue an interrupted run, skipping the boards already in --output")
+    parser.add_argument("--unique", action="store_true", help="validate: also count the solutions of puzzles")
+    parser.add_argument("--limit", type=int, default=2, help="count: stop counting at this many solutions")
+    parser.add_argument("--progress", type=float, default=5.0,
+                        help="seconds between throughput reports on stderr, 0 for none")
+    args = parser.parse_args(argv)
+    try:
+        return run(args)
+    except ValueError as error:
+        parser.error(str(error))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
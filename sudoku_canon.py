@@ -0,0 +1,351 @@
+import hashlib
+import mmap
+import os
+import struct
+from itertools import permutations, product
+from operator import itemgetter
+
+from sudoku_board import UNITS
+from sudoku_generator import solve_sudoku
+
+# Canonical forms of 9x9 boards under the Sudoku symmetry group (transposition, band and row-in-band
+# permutations, stack and column-in-stack permutations, and digit relabeling), and an on-disk index
+# of their hashes for dropping duplicate puzzles from a stream.
+#
+# The canonical form is the lexicographically smallest 81-character string, read in row order with 0
+# for empty cells, among all transforms of the board, with digits relabeled 1, 2, 3, ... in order of
+# first appearance. Two boards have the same canonical form exactly when one is a symmetry variant
+# of the other, e.g. one made from the other by sudoku_transform.
+#
+# Instead of trying all 2 * 6^8 cell orders, canonical_form builds the smallest string from the front
+# and only follows the partial transforms that tie for the smallest prefix so far. The first row
+# picks columns one cell at a time; once the column order is fixed, every later row is picked whole.
+# A solved grid needs a different start, because its first row reads 123456789 under every column
+# order: there the second row is minimised directly over all 1296 column orders.
+#
+# On sparse boards many of those partial transforms tie, because empty rows and columns look alike.
+# Two rows of the same band that are equal, or the same row of two equal bands, can be swapped without
+# changing the board, so only the first of them is followed; columns likewise. Without this an empty
+# board would follow every one of the 2 * 6^8 cell orders.
+
+
+# Digit labels are kept as a bytes.translate table mapping each digit to its new label, 0 to 0, and
+# digits that have no label yet to UNLABELED
+UNLABELED = 255
+NO_LABELS = bytes([0] + [UNLABELED] * 255)
+
+# Every stack-preserving column order, as bytes, with a translate table from each column to its
+# 1-based position in that order
+# Filled by build_column_orders the first time a solved grid is canonicalized, to keep imports fast
+COLUMN_ORDERS = []
+COLUMN_POSITIONS = []
+
+
+def build_column_orders():
+    for stacks in permutations(range(3)):
+        for inner in product(list(permutations(range(3))), repeat=3):
+            order = bytes(stack * 3 + col for stack, cols in zip(stacks, inner) for col in cols)
+            table = bytearray(256)
+            for position, col in enumerate(order):
+                table[col] = position + 1
+            COLUMN_ORDERS.append(order)
+            COLUMN_POSITIONS.append(bytes(table))
+
+
+# Returns the board as 81 bytes in row order, raising ValueError unless it is a 9x9 board of digits
+# 0-9 with no digit repeated in a row, column or box
+# Only a valid board has a meaningful canonical form: a full board that repeats digits is not a
+# solution grid, and the shortcut for solved grids would give it a wrong one
+def board_bytes(board):
+    if len(board) != 9 or any(len(row) != 9 for row in board):
+        raise ValueError("canonical forms are only defined for 9x9 boards")
+    flat = bytes(value for row in board for value in row)
+    if max(flat) > 9:
+        raise ValueError("board has a value above 9")
+    for unit in UNITS:
+        digits = [flat[index] for index in unit if flat[index]]
+        if len(digits) != len(set(digits)):
+            raise ValueError("board repeats a digit in a row, column or box")
+    return flat
+
+
+# Returns, for each row of a grid given as 9 row strings, the first row that can be swapped with it by
+# a band or row-in-band permutation that leaves the grid unchanged: a row equal to it in the same band,
+# or the row at the same place in an equal band
+def row_twins(lines):
+    bands = [b"".join(lines[band:band + 3]) for band in range(0, 9, 3)]
+    keys = [(bands[row // 3], lines[row]) for row in range(9)]
+    return [keys.index(key) for key in keys]
+
+
+# Returns the candidates that are not twins of an earlier candidate, as given by twins (see row_twins)
+# Following only those reaches every board the search would reach through the others
+def distinct(candidates, twins):
+    seen = set()
+    kept = []
+    for candidate in candidates:
+        if twins[candidate] not in seen:
+            seen.add(twins[candidate])
+            kept.append(candidate)
+    return kept
+
+
+# Returns the canonical form of a valid 9x9 board (a list of rows) as an 81-character string
+# Raises ValueError for an invalid board, as described at board_bytes
+def canonical_form(board):
+    flat = board_bytes(board)
+    transposed = bytes(flat[col * 9 + row] for row in range(9) for col in range(9))
+    grids = [[grid[row * 9:row * 9 + 9] for row in range(9)] for grid in (flat, transposed)]
+    if transposed == flat:
+        # A symmetric board reads the same transposed, so one grid gives every transform
+        grids.pop()
+    # Row twins of every grid by id, and its column twins, which are the row twins of the other grid
+    twins = {id(lines): row_twins(lines) for lines in grids}
+    columns = {id(grids[0]): twins[id(grids[-1])], id(grids[-1]): twins[id(grids[0])]}
+    if 0 in flat:
+        result, states = first_row(grids, twins, columns)
+        start = 1
+    else:
+        result, states = first_rows_of_solution(grids)
+        start = 2
+
+    # Later rows: the column order is fixed, so compare whole relabeled rows
+    for position in range(start, 9):
+        best = None
+        chosen = []
+        for state in states:
+            lines, rows, getter, labels, next_label = state
+            if position % 3 == 0:
+                used = [row // 3 for row in rows]
+                allowed = [row for row in range(9) if row // 3 not in used]
+            else:
+                band = rows[-1] // 3 * 3
+                allowed = [row for row in range(band, band + 3) if row not in rows]
+            for row in distinct(allowed, twins[id(lines)]):
+                line = bytes(getter(lines[row])).translate(labels)
+                new_labels = labels
+                label = next_label
+                if UNLABELED in line:
+                    # Give the row's new digits the next labels, in order of appearance
+                    values = getter(lines[row])
+                    table = bytearray(labels)
+                    for value in values:
+                        if table[value] == UNLABELED:
+                            table[value] = label
+                            label += 1
+                    new_labels = bytes(table)
+                    line = bytes(values).translate(new_labels)
+                if best is None or line < best:
+                    best = line
+                    chosen = []
+                if line == best:
+                    chosen.append((lines, rows + (row,), getter, new_labels, label))
+        result.extend(best)
+        states = chosen
+    return "".join(map(str, result))
+
+
+# Picks the smallest first row of a board with empty cells, one column at a time, keeping the three
+# columns of each stack together
+# twins and columns map the id of every grid to its row and column twins, as given by row_twins
+# Returns the row and the tied partial transforms: (grid rows, row order, column getter, digit
+# labels, next label)
+def first_row(grids, twins, columns):
+    states = [(lines, (first,), (), NO_LABELS, 1) for lines in grids
+              for first in distinct(range(9), twins[id(lines)])]
+    result = []
+    for position in range(9):
+        best = UNLABELED
+        chosen = []
+        for state in states:
+            lines, rows, cols, labels, next_label = state
+            line = lines[rows[0]]
+            if position % 3 == 0:
+                used = [col // 3 for col in cols]
+                allowed = [col for col in range(9) if col // 3 not in used]
+            else:
+                stack = cols[-1] // 3 * 3
+                allowed = [col for col in range(stack, stack + 3) if col not in cols]
+            for col in distinct(allowed, columns[id(lines)]):
+                label = labels[line[col]]
+                if label == UNLABELED:
+                    label = next_label
+                if label < best:
+                    best = label
+                    chosen = []
+                if label == best:
+                    chosen.append((state, col))
+        result.append(best)
+        states = []
+        for (lines, rows, cols, labels, next_label), col in chosen:
+            value = lines[rows[0]][col]
+            if labels[value] == UNLABELED:
+                labels = labels[:value] + bytes((next_label,)) + labels[value + 1:]
+                next_label += 1
+            states.append((lines, rows, cols + (col,), labels, next_label))
+    return result, [(lines, rows, itemgetter(*cols), labels, next_label)
+                    for lines, rows, cols, labels, next_label in states]
+
+
+# Picks the smallest first two rows of a solved grid, returning them like first_row
+# The first row always relabels to 123456789, so a digit's label is the position of its column in
+# the column order, and the second row reads as that order applied to where each of its digits sits
+# in the first row.
+def first_rows_of_solution(grids):
+    if not COLUMN_ORDERS:
+        build_column_orders()
+    best = None
+    chosen = []
+    for lines in grids:
+        for first in range(9):
+            column_of = bytearray(256)
+            for col, value in enumerate(lines[first]):
+                column_of[value] = col
+            band = first // 3 * 3
+            for second in range(band, band + 3):
+                if second == first:
+                    continue
+                # moves[col] is the column of the first row holding the digit at col in the second row
+                moves = bytes(lines[second]).translate(column_of) + bytes(247)
+                for number in range(len(COLUMN_ORDERS)):
+                    line = COLUMN_ORDERS[number].translate(moves).translate(COLUMN_POSITIONS[number])
+                    if best is None or line < best:
+                        best = line
+                        chosen = []
+                    if line == best:
+                        chosen.append((lines, (first, second), number))
+    states = []
+    for lines, rows, number in chosen:
+        labels = bytearray(NO_LABELS)
+        for col, value in enumerate(lines[rows[0]]):
+            labels[value] = COLUMN_POSITIONS[number][col]
+        states.append((lines, rows, itemgetter(*COLUMN_ORDERS[number]), bytes(labels), 10))
+    return list(range(1, 10)) + list(best), states
+
+
+# Returns a compact hash of a board's canonical form, as a nonzero 64-bit integer
+def canonical_hash(board):
+    digest = hashlib.blake2b(canonical_form(board).encode("ascii"), digest_size=8).digest()
+    return int.from_bytes(digest, "little") or 1
+
+
+# On-disk set of 64-bit hashes, kept as an open-addressing table with linear probing in a
+# memory-mapped file, so a dedupe pass over millions of puzzles costs 8 bytes per puzzle on disk and
+# almost nothing in memory. The table doubles (into a temporary file that replaces the old one)
+# once it is 70% full.
+#
+# File layout, little-endian:
+#   header  MAGIC, version (uint16), unused (uint16), capacity (uint64), count (uint64)
+#   slots   capacity uint64 hashes, 0 for an empty slot
+MAGIC = b"SDKH"
+VERSION = 1
+HEADER = struct.Struct("<4sHHQQ")
+SLOT = struct.Struct("<Q")
+INITIAL_CAPACITY = 1 << 16
+MAX_LOAD = 0.7
+
+
+class HashIndex:
+    def __init__(self, path, capacity=INITIAL_CAPACITY):
+        self.path = path
+        if not os.path.exists(path) or os.path.getsize(path) == 0:
+            self.create(path, capacity)
+        self.open()
+
+    # Writes an empty table of capacity slots (a power of two) to path
+    @staticmethod
+    def create(path, capacity):
+        with open(path, "wb") as file:
+            file.write(HEADER.pack(MAGIC, VERSION, 0, capacity, 0))
+            file.truncate(HEADER.size + capacity * SLOT.size)
+
+    def open(self):
+        self.file = open(self.path, "r+b")
+        self.data = mmap.mmap(self.file.fileno(), 0)
+        magic, version, unused, self.capacity, self.count = HEADER.unpack_from(self.data, 0)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError("%s is not a hash index" % self.path)
+        if len(self.data) != HEADER.size + self.capacity * SLOT.size:
+            self.close()
+            raise ValueError("%s is truncated" % self.path)
+
+    def __len__(self):
+        return self.count
+
+    # Returns the byte offset of key's slot, or of the empty slot where it would go
+    def find(self, key):
+        mask = self.capacity - 1
+        slot = key & mask
+        while True:
+            offset = HEADER.size + slot * SLOT.size
+            stored = SLOT.unpack_from(self.data, offset)[0]
+            if stored == key or stored == 0:
+                return offset, stored
+            slot = (slot + 1) & mask
+
+    def __contains__(self, key):
+        return self.find(key)[1] != 0
+
+    # Adds key (a nonzero 64-bit integer); returns True if it was not in the index yet
+    def add(self, key):
+        offset, stored = self.find(key)
+        if stored:
+            return False
+        SLOT.pack_into(self.data, offset, key)
+        self.count += 1
+        HEADER.pack_into(self.data, 0, MAGIC, VERSION, 0, self.capacity, self.count)
+        if self.count > self.capacity * MAX_LOAD:
+            self.grow()
+        return True
+
+    def keys(self):
+        for slot in range(self.capacity):
+            stored = SLOT.unpack_from(self.data, HEADER.size + slot * SLOT.size)[0]
+            if stored:
+                yield stored
+
+    def grow(self):
+        temporary = self.path + ".tmp"
+        self.create(temporary, self.capacity * 2)
+        bigger = HashIndex(temporary)
+        for key in self.keys():
+            bigger.add(key)
+        bigger.close()
+        self.close()
+        os.replace(temporary, self.path)
+        self.open()
+
+    def flush(self):
+        self.data.flush()
+
+    def close(self):
+        if self.data is not None:
+            self.data.close()
+            self.data = None
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# Yields the puzzles from a stream whose canonical hash is new to index (a HashIndex), adding it
+# Puzzles that are symmetry variants of one already seen are dropped. With near=True, near-duplicates
+# are dropped too: puzzles whose solution is a symmetry variant of one seen before, even if different
+# cells were removed. This solves every puzzle, so it is only meaningful for unique puzzles, and
+# puzzles without a solution are dropped as well, as there is no solution grid to compare.
+# With pairs=True the items are (puzzle, extra) pairs, as generate_many yields with stats=True.
+# Invalid boards raise ValueError, as in canonical_form.
+def unique_puzzles(puzzles, index, near=False, pairs=False):
+    for item in puzzles:
+        puzzle = item[0] if pairs else item
+        if near:
+            board_bytes(puzzle)
+            puzzle = solve_sudoku(puzzle)
+            if puzzle is None:
+                continue
+        if index.add(canonical_hash(puzzle)):
+            yield item
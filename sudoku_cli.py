@@ -0,0 +1,247 @@
+import argparse
+import json
+import random
+import sys
+
+from sudoku_board import board_to_string, string_to_board
+
+# Command-line interface to the pygame-free core, run with: python -m sudoku_cli <command>
+#
+# Boards are read and written one per line, one character per cell in row order: 0 (or '.') for
+# an empty cell, 1-9 for digits and letters A-P above 9 on larger boards.
+#
+# Every command imports the modules it needs when it runs, so starting the CLI only pays for
+# argparse and sudoku_board; benchmark.py startup measures it. That is also why --difficulty and
+# --band are checked in generate rather than with argparse choices.
+
+
+# Yields the boards given on the command line, or one per non-empty line of stdin
+def read_boards(args):
+    lines = args.boards if args.boards else sys.stdin
+    for line in lines:
+        line = line.strip()
+        if line:
+            yield line, string_to_board(line)
+
+
+# Prints generated puzzles, one per line
+# With --stats, also writes one JSON object of generation stats per puzzle to that file ('-' for stderr);
+# with --band the objects hold each puzzle's rating instead
+# With --workers, puzzles are generated by generate_many on a process pool
+# With --derive, puzzles are symmetry variants of that many normally generated seed puzzles
+# With --dedupe, puzzles whose canonical form is already in that hash index file are dropped
+def generate(args):
+    from sudoku_generator import DIFFICULTIES, generate_many
+    if args.removed is None and args.difficulty not in DIFFICULTIES:
+        raise ValueError("--difficulty must be one of %s" % ", ".join(DIFFICULTIES))
+    removed = args.removed if args.removed is not None else DIFFICULTIES[args.difficulty]
+    out = sys.stdout
+    stats_file = None
+    if args.stats == "-":
+        stats_file = sys.stderr
+    elif args.stats:
+        stats_file = open(args.stats, "w")
+    if args.band:
+        from sudoku_rater import RATING_BANDS
+        if args.band not in RATING_BANDS:
+            raise ValueError("--band must be one of %s" % ", ".join(RATING_BANDS))
+        puzzles = generate_banded(args, stats_file is not None)
+    elif args.derive:
+        from sudoku_transform import generate_derived
+        if args.size != 9 or stats_file is not None:
+            raise ValueError("--derive only makes 9x9 puzzles and has no --stats")
+        rng = random.Random(args.seed) if args.seed is not None else None
+        puzzles = (puzzle for puzzle, solution in generate_derived(args.count, removed, args.derive, args.unique, rng))
+    elif args.workers:
+        puzzles = generate_many(args.count, removed, workers=args.workers, seed=args.seed, size=args.size,
+                                unique=args.unique, stats=stats_file is not None)
+    else:
+        puzzles = generate_serial(args, removed, stats_file is not None)
+    index = None
+    if args.dedupe:
+        if args.size != 9:
+            raise ValueError("--dedupe only works on 9x9 puzzles")
+        from sudoku_canon import HashIndex, unique_puzzles
+        index = HashIndex(args.dedupe)
+        puzzles = unique_puzzles(puzzles, index, args.near, stats_file is not None)
+    written = 0
+    for number, item in enumerate(puzzles):
+        if stats_file is not None:
+            item, record = item
+            record["puzzle"] = number
+            stats_file.write(json.dumps(record) + "\n")
+        out.write(board_to_string(item) + "\n")
+        written += 1
+    if stats_file is not None and stats_file is not sys.stderr:
+        stats_file.close()
+    if index is not None:
+        index.close()
+        if written < args.count:
+            sys.stderr.write("dropped %d duplicate%s puzzles\n" % (
+                args.count - written, " or unsolvable" if args.near else ""))
+
+
+# Yields puzzles for generate in this process, as (puzzle, stats dict) pairs when stats is True
+def generate_serial(args, removed, stats):
+    from sudoku_generator import GenerationStats, generate_sudoku
+    rng = random.Random(args.seed) if args.seed is not None else None
+    for i in range(args.count):
+        if not stats:
+            yield generate_sudoku(args.size, removed, args.unique, rng)
+        else:
+            puzzle_stats = GenerationStats()
+            puzzle = generate_sudoku(args.size, removed, args.unique, rng, puzzle_stats)
+            yield puzzle, puzzle_stats.as_dict()
+
+
+# Yields puzzles for generate whose rating falls in args.band
+# When stats is True, yields (puzzle, rating dict) pairs instead
+def generate_banded(args, stats):
+    from sudoku_rater import generate_rated
+    rng = random.Random(args.seed) if args.seed is not None else None
+    for i in range(args.count):
+        result = generate_rated(args.band, rng)
+        if result is None:
+            raise ValueError("no %s puzzle found, try again" % args.band)
+        puzzle, solution, rating = result
+        yield (puzzle, rating.as_dict()) if stats else puzzle
+
+
+# Prints the sparsest minimal puzzle found within the budget, reporting progress on stderr after
+# every restart; a restart gets at most an eighth of the time or node budget, so there are several
+# reports. With no budget given, searches for 10 seconds.
+def minimal(args):
+    from sudoku_minimal import find_minimal
+    timeout = args.time
+    if timeout is None and args.nodes is None and args.restarts is None:
+        timeout = 10.0
+
+    def report(totals):
+        sys.stderr.write("%.1f s: %d restarts, %d nodes, best %d clues (last %d)\n" % (
+            totals["elapsed"], totals["restarts"], totals["nodes"], totals["clues"], totals["last"]))
+    result = find_minimal(timeout, args.nodes, args.restarts, args.workers, args.seed, args.patience,
+                          None if args.quiet else report)
+    sys.stdout.write(board_to_string(result["puzzle"]) + "\n")
+    sys.stderr.write("%d clues%s, %d restarts, %d nodes in %.1f s\n" % (
+        result["clues"], "" if result["minimal"] else " (not minimal, the budget ran out)",
+        result["restarts"], result["nodes"], result["elapsed"]))
+
+
+# Prints the canonical form of every input board: the same string for boards that are symmetry
+# variants of each other
+def canon(args):
+    from sudoku_canon import canonical_form
+    out = sys.stdout
+    for line, board in read_boards(args):
+        if len(board) != 9:
+            raise ValueError("only 9x9 boards have a canonical form")
+        out.write(canonical_form(board) + "\n")
+
+
+# Prints "<score> <hardest technique>" for every input puzzle
+def rate(args):
+    from sudoku_rater import rate_puzzle
+    out = sys.stdout
+    for line, board in read_boards(args):
+        rating = rate_puzzle(board)
+        if args.json:
+            out.write(json.dumps(rating.as_dict()) + "\n")
+        else:
+            out.write("%d %s\n" % (rating.score, rating.hardest or "contradiction"))
+
+
+# Prints the solution of every input puzzle, or "unsolvable"
+def solve(args):
+    from sudoku_generator import solve_sudoku
+    out = sys.stdout
+    failed = 0
+    for line, board in read_boards(args):
+        solution = solve_sudoku(board)
+        if solution is None:
+            failed += 1
+            out.write("unsolvable\n")
+        else:
+            out.write(board_to_string(solution) + "\n")
+    return 1 if failed else 0
+
+
+# Prints one verdict per input board, as described at sudoku_bulk.board_verdict
+# With --unique, a valid puzzle is reported as unique, multiple or unsolvable instead
+def validate(args):
+    from sudoku_bulk import board_verdict
+    out = sys.stdout
+    failed = 0
+    for line, board in read_boards(args):
+        verdict = board_verdict(board, args.unique)
+        if verdict in ("invalid", "unsolvable"):
+            failed += 1
+        out.write(verdict + "\n")
+    return 1 if failed else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m sudoku_cli",
+                                     description="Generate, solve, rate, validate and canonicalize Sudoku puzzles "
+                                                 "without the GUI")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    generate_parser = commands.add_parser("generate", help="print new puzzles, one per line")
+    generate_parser.add_argument("-n", "--count", type=int, default=1)
+    generate_parser.add_argument("-d", "--difficulty", default="medium", help="easy, medium or hard")
+    generate_parser.add_argument("--removed", type=int, help="cells to remove, overrides --difficulty")
+    generate_parser.add_argument("--size", type=int, default=9, help="board size, any perfect square")
+    generate_parser.add_argument("--seed", type=int)
+    generate_parser.add_argument("--unique", action="store_true", help="only make puzzles with one solution")
+    generate_parser.add_argument("--band", help="easy, medium, hard or expert: aim for a technique-based rating instead of a cell count (9x9 only)")
+    generate_parser.add_argument("--workers", type=int, help="generate on a pool of this many processes")
+    generate_parser.add_argument("--derive", type=int, metavar="SEEDS",
+                                 help="derive the puzzles from this many seed puzzles by symmetry transforms (9x9 only)")
+    generate_parser.add_argument("--dedupe", metavar="INDEX",
+                                 help="skip puzzles already recorded in this hash index file, and record the rest")
+    generate_parser.add_argument("--near", action="store_true",
+                                 help="with --dedupe, also skip puzzles whose solution grid was seen before")
+    generate_parser.add_argument("--stats", metavar="FILE", help="write per-puzzle generation stats as JSON lines")
+    generate_parser.set_defaults(run=generate)
+
+    minimal_parser = commands.add_parser("minimal", help="search for the sparsest minimal puzzle within a budget, "
+                                                         "reporting progress on stderr after every restart")
+    minimal_parser.add_argument("--time", type=float,
+                                help="seconds to search for (10 if no budget is given); "
+                                     "each restart gets at most an eighth")
+    minimal_parser.add_argument("--nodes", type=int,
+                                help="uniqueness-check search nodes to spend; each restart gets at most an eighth")
+    minimal_parser.add_argument("--restarts", type=int, help="fresh grids to start from")
+    minimal_parser.add_argument("--workers", type=int, help="processes to run restarts on, one per CPU by default")
+    minimal_parser.add_argument("--seed", type=int)
+    minimal_parser.add_argument("--patience", type=int, default=100,
+                                help="clue exchanges without fewer clues before a restart ends early")
+    minimal_parser.add_argument("--quiet", action="store_true", help="no progress reports on stderr")
+    minimal_parser.set_defaults(run=minimal)
+
+    solve_parser = commands.add_parser("solve", help="print the solution of each puzzle")
+    solve_parser.add_argument("boards", nargs="*", help="puzzles to solve, read from stdin if omitted")
+    solve_parser.set_defaults(run=solve)
+
+    canon_parser = commands.add_parser("canon", help="print each board's canonical form under the symmetry group")
+    canon_parser.add_argument("boards", nargs="*", help="boards to canonicalize, read from stdin if omitted")
+    canon_parser.set_defaults(run=canon)
+
+    rate_parser = commands.add_parser("rate", help="grade each puzzle by the solving techniques it needs")
+    rate_parser.add_argument("boards", nargs="*", help="puzzles to rate, read from stdin if omitted")
+    rate_parser.add_argument("--json", action="store_true", help="print the full rating as JSON")
+    rate_parser.set_defaults(run=rate)
+
+    validate_parser = commands.add_parser("validate", help="check each board for repeated digits")
+    validate_parser.add_argument("boards", nargs="*", help="boards to check, read from stdin if omitted")
+    validate_parser.add_argument("--unique", action="store_true", help="also count the solutions of puzzles")
+    validate_parser.set_defaults(run=validate)
+
+    args = parser.parse_args(argv)
+    try:
+        return args.run(args)
+    except ValueError as error:
+        parser.error(str(error))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,15 +1,32 @@
 import random
+import time
+
+from sudoku_board import unit_tables
+
+# Number of cells removed from a 9x9 board for each difficulty
+DIFFICULTIES = {"easy": 30, "medium": 40, "hard": 50}
 
 
 # Defines the SudokuGenerator class which creates Sudoku objects
 class SudokuGenerator:
     # Instantiates required attributes of the object
-    def __init__(self, row_length, removed_cells):
+    # When unique is True, remove_cells only removes cells that keep the solution unique
+    # rng is any object with the random module's interface, such as a seeded random.Random
+    # row_length can be any perfect square: 4, 9, 16, 25, ...
+    def __init__(self, row_length, removed_cells, unique=False, rng=None):
         self.row_length = int(row_length)
         self.removed_cells = int(removed_cells)
+        self.unique = unique
+        self.random = rng if rng is not None else random
         # Creates a 2D list that represents the empty sudoku board
         self.board = [[0 for i in range(row_length)] for i in range(row_length)]
         self.box_length = int(row_length ** 0.5)
+        # Box of every cell, indexed by row * row_length + col, shared with the game's peer tables
+        self.box_of = unit_tables(self.row_length)[0]
+        # Occupancy bitmasks: bit num is set when num is already used in that row, column or box
+        self.row_masks = [0] * self.row_length
+        self.col_masks = [0] * self.row_length
+        self.box_masks = [0] * self.row_length
 
     # Simple getter function for the board
     def get_board(self):
@@ -22,56 +39,64 @@ class SudokuGenerator:
     # Checks if a given number would be valid in a given row
     # Returns True if num is not in row, False if num is in row
     def valid_in_row(self, row, num):
-        # Iterates through each column and checks if num is already present in the row
-        for i in range(self.row_length):
-            if self.board[int(row)][i] == num:
-                return False
-        return True
+        return not self.row_masks[int(row)] >> num & 1
 
     # Checks if a given number would be valid in a given column
     # Returns True if num is not in col, False if num is in col
     def valid_in_col(self, col, num):
-        for i in range(self.row_length):
-            if self.board[i][int(col)] == num:
-                return False
-        return True
+        return not self.col_masks[int(col)] >> num & 1
 
     # Checks if a given number would be valid in a given box
     # Returns True if num is not in the box, False if num is in the box
     def valid_in_box(self, row_start, col_start, num):
-        for row in range(int(row_start), int(row_start) + 3):
-            for col in range(int(col_start), int(col_start) + 3):
-                if self.board[int(row)][int(col)] == num:
-                    return False
-        return True
+        return not self.box_masks[self.box_index(int(row_start), int(col_start))] >> num & 1
+
+    # Returns the index of the box containing (row, col), counted left to right, top to bottom
+    def box_index(self, row, col):
+        return self.box_of[row * self.row_length + col]
+
+    # Writes num into (row, col) and marks it as used in the row, column and box masks
+    def place(self, row, col, num):
+        bit = 1 << num
+        self.board[row][col] = num
+        self.row_masks[row] |= bit
+        self.col_masks[col] |= bit
+        self.box_masks[self.box_index(row, col)] |= bit
 
-    # Checks all valid conditions using previously defined methods
-    # Returns True if all methods pass, returns False if any fail
+    # Clears (row, col) and releases its number from the row, column and box masks
+    def unplace(self, row, col):
+        bit = ~(1 << self.board[row][col])
+        self.board[row][col] = 0
+        self.row_masks[row] &= bit
+        self.col_masks[col] &= bit
+        self.box_masks[self.box_index(row, col)] &= bit
+
+    # Returns a bitmask of the numbers already used by the row, column and box of (row, col)
+    def used_mask(self, row, col):
+        return self.row_masks[row] | self.col_masks[col] | self.box_masks[self.box_of[row * self.row_length + col]]
+
+    # Returns the numbers that could legally be placed at (row, col), in increasing order
+    def candidates(self, row, col):
+        used = self.used_mask(row, col)
+        return [num for num in range(1, self.row_length + 1) if not used >> num & 1]
+
+    # Checks all valid conditions with a single lookup in the occupancy masks
+    # Returns True if num is free in the row, column and box, returns False otherwise
     def is_valid(self, row, col, num):
-        if not self.valid_in_col(col, num):
-            return False
-        if not self.valid_in_row(row, num):
-            return False
-        row_start = int(row) - (int(row % 3))
-        col_start = int(col) - (int(col % 3))
-        if not self.valid_in_box(row_start, col_start, num):
-            return False
-        return True
+        return not self.used_mask(int(row), int(col)) >> num & 1
 
     # Fills the given box with random, and valid, numbers
     def fill_box(self, row_start, col_start):
+        # A box holds every number exactly once, so a shuffled run of 1..row_length fills it
+        nums = self.random.sample(range(1, self.row_length + 1), self.row_length)
         # Iterates through each cell in the given box
-        for row in range(row_start, row_start + 3):
-            for col in range(col_start, col_start + 3):
-                # Sets the cell to a valid, random number
-                num = random.randint(1, 9)
-                while not self.valid_in_box(row_start, col_start, num):
-                    num = random.randint(1, 9)
-                self.board[row][col] = num
+        for row in range(row_start, row_start + self.box_length):
+            for col in range(col_start, col_start + self.box_length):
+                self.place(row, col, nums.pop())
 
     # Fills the board diagonally using the fill_box method
     def fill_diagonal(self):
-        for i in range(0, self.row_length, 3):
+        for i in range(0, self.row_length, self.box_length):
             self.fill_box(i, i)
 
     def fill_remaining(self, row, col):
@@ -93,33 +118,378 @@ class SudokuGenerator:
                 if row >= self.row_length:
                     return True
 
+        # The masks are restored after every failed attempt, so one lookup covers the whole loop
+        used = self.used_mask(row, col)
         for num in range(1, self.row_length + 1):
-            if self.is_valid(row, col, num):
-                self.board[row][col] = num
+            if not used >> num & 1:
+                self.place(row, col, num)
                 if self.fill_remaining(row, col + 1):
                     return True
-                self.board[row][col] = 0
+                self.unplace(row, col)
         return False
 
-    def fill_values(self):
+    # Fills every empty cell with fill_search, restarting whenever a search gives up
+    # Unlike fill_remaining this scales past 9x9. A run that takes more than node_budget placements
+    # is abandoned and restarted from a freshly filled diagonal, which cuts off unlucky searches.
+    def fill_constrained(self, node_budget=None):
+        if node_budget is None:
+            node_budget = 2 * self.row_length * self.row_length
+        while not self.fill_search(node_budget):
+            for row in range(self.row_length):
+                for col in range(self.row_length):
+                    if self.board[row][col] != 0:
+                        self.unplace(row, col)
+            self.fill_diagonal()
+        return True
+
+    # Iterative depth-first search that fills every empty cell of the board
+    # It always branches on the most constrained empty cell and tries its numbers in random order.
+    # The search keeps its own stack instead of recursing, so the depth is not limited by Python's
+    # call stack. Returns True once the board is full, False if the board has no solution, and None
+    # if node_budget placements or timeout seconds ran out first; in both of those cases the board
+    # is left as it was. search_nodes, search_backtracks, search_depth and search_probes (cells whose
+    # candidates were looked up) describe the last search.
+    def fill_search(self, node_budget=None, timeout=None):
+        deadline = time.perf_counter() + timeout if timeout is not None else None
+        row_masks, col_masks, box_masks = self.row_masks, self.col_masks, self.box_masks
+        board = self.board
+        all_nums = (1 << (self.row_length + 1)) - 2
+        empty = [(row, col, self.box_index(row, col))
+                 for row in range(self.row_length) for col in range(self.row_length)
+                 if board[row][col] == 0]
+        # Each frame is (row, col, box, position the cell was taken from in empty, numbers left to try)
+        stack = []
+        nodes = 0
+        backtracks = 0
+        depth = 0
+        probes = 0
+        result = None
+        while result is None:
+            if not empty:
+                result = True
+                break
+            # Picks the empty cell with the fewest candidates
+            best = 0
+            best_free = 0
+            best_size = self.row_length + 1
+            for i in range(len(empty)):
+                row, col, box = empty[i]
+                free = all_nums & ~(row_masks[row] | col_masks[col] | box_masks[box])
+                size = free.bit_count()
+                if size < best_size:
+                    best, best_free, best_size = i, free, size
+                    if size <= 1:
+                        break
+            probes += i + 1
+            if best_size:
+                empty[best], empty[-1] = empty[-1], empty[best]
+                row, col, box = empty.pop()
+                nums = [num for num in range(1, self.row_length + 1) if best_free >> num & 1]
+                self.random.shuffle(nums)
+                stack.append((row, col, box, best, nums))
+                depth = max(depth, len(stack))
+            # Moves the top frame on to its next number, dropping frames that have none left
+            while True:
+                if not stack:
+                    result = False
+                    break
+                row, col, box, position, nums = stack[-1]
+                if board[row][col]:
+                    self.unplace(row, col)
+                if nums:
+                    self.place(row, col, nums.pop())
+                    nodes += 1
+                    break
+                stack.pop()
+                backtracks += 1
+                empty.append((row, col, box))
+                empty[position], empty[-1] = empty[-1], empty[position]
+            if node_budget is not None and nodes >= node_budget and result is None:
+                break
+            if deadline is not None and nodes & 255 == 0 and time.perf_counter() > deadline:
+                break
+        if result is None:
+            # Out of budget: undoes every placement still on the stack
+            for row, col, box, position, nums in stack:
+                if board[row][col]:
+                    self.unplace(row, col)
+        self.search_nodes = nodes
+        self.search_backtracks = backtracks
+        self.search_depth = depth
+        self.search_probes = probes
+        return result
+
+    # Writes the filled-in cells of a board (a list of rows, 0 for empty) into this generator
+    # Returns False, leaving the generator partly loaded, if two of them conflict
+    def load_board(self, board):
+        for row in range(self.row_length):
+            for col in range(self.row_length):
+                num = board[row][col]
+                if num != 0:
+                    if not self.is_valid(row, col, num):
+                        return False
+                    self.place(row, col, num)
+        return True
+
+    # Fills the empty cells of the loaded board with a solution, returning False if there is none
+    def solve(self):
+        return bool(self.fill_search())
+
+    # Fills the diagonal boxes, then the rest of the board
+    # strategy is "search" (the default) for fill_constrained, the iterative most-constrained-first
+    # search, or "recursive" for the original fill_remaining order, which only finishes in reasonable
+    # time on 9x9 boards
+    def fill_values(self, strategy="search"):
         self.fill_diagonal()
-        self.fill_remaining(0, self.box_length)
+        if strategy == "recursive":
+            self.fill_remaining(0, self.box_length)
+        elif strategy == "search":
+            self.fill_constrained()
+        else:
+            raise ValueError("unknown fill strategy %r" % strategy)
+
+    # Counts the solutions of the current board, stopping as soon as limit solutions are found
+    # The board and masks are left exactly as they were
+    def count_solutions(self, limit=2):
+        empty = [(row, col, self.box_index(row, col))
+                 for row in range(self.row_length) for col in range(self.row_length)
+                 if self.board[row][col] == 0]
+        return self.search_count(empty, limit)
+
+    # Backtracking counter behind count_solutions, always branching on the most constrained cell
+    # The masks are read and written directly because this is the innermost loop of generation
+    def search_count(self, empty, limit):
+        if not empty:
+            return 1
+        row_masks, col_masks, box_masks = self.row_masks, self.col_masks, self.box_masks
+        all_nums = (1 << (self.row_length + 1)) - 2
+        best = 0
+        best_free = 0
+        best_size = self.row_length + 1
+        for i in range(len(empty)):
+            row, col, box = empty[i]
+            free = all_nums & ~(row_masks[row] | col_masks[col] | box_masks[box])
+            size = free.bit_count()
+            if size < best_size:
+                best, best_free, best_size = i, free, size
+                if size <= 1:
+                    break
+        if best_size == 0:
+            return 0
+        # Moves the chosen cell to the end so it can be popped and pushed back in O(1)
+        empty[best], empty[-1] = empty[-1], empty[best]
+        cell = empty.pop()
+        row, col, box = cell
+        count = 0
+        while best_free and count < limit:
+            bit = best_free & -best_free
+            best_free ^= bit
+            row_masks[row] |= bit
+            col_masks[col] |= bit
+            box_masks[box] |= bit
+            count += self.search_count(empty, limit - count)
+            row_masks[row] ^= bit
+            col_masks[col] ^= bit
+            box_masks[box] ^= bit
+        empty.append(cell)
+        empty[best], empty[-1] = empty[-1], empty[best]
+        return count
+
+    # Checks whether the filled-in value at (row, col) could be removed without a second solution
+    # The board is assumed to have exactly one solution, so only the other candidates need checking
+    def removable(self, row, col):
+        value = self.board[row][col]
+        self.unplace(row, col)
+        unique = True
+        for num in self.candidates(row, col):
+            if num != value:
+                self.place(row, col, num)
+                found = self.count_solutions(1)
+                self.unplace(row, col)
+                if found:
+                    unique = False
+                    break
+        self.place(row, col, value)
+        return unique
 
     # Removes random cells according to what difficulty the game is on
+    # Cells are visited in a pre-shuffled order, so every removal takes constant time to pick
+    def remove_cells(self):
+        cells = [(row, col) for row in range(self.row_length) for col in range(self.row_length)]
+        self.random.shuffle(cells)
+        removed = 0
+        for row, col in cells:
+            if removed >= self.removed_cells:
+                break
+            if self.board[row][col] == 0:
+                continue
+            # In unique mode, cells whose removal would allow a second solution are kept
+            if self.unique and not self.removable(row, col):
+                continue
+            self.unplace(row, col)
+            removed += 1
+
+
+# Counters and timings collected by an InstrumentedGenerator
+# Times are in seconds. nodes, backtracks and max_depth describe the search that fills the board.
+# For fill_remaining every recursive call is a node and a call that returns without finishing the
+# board is a backtrack; for fill_search every placement is a node and every cell given up is a backtrack.
+# count_nodes is the number of search nodes the uniqueness checks in remove_cells visited.
+# is_valid_calls counts validity lookups: is_valid and used_mask calls, plus the cells a
+# most-constrained-first search probes, which read the masks directly.
+# restarts counts how often fill_constrained gave up on a search and refilled the diagonal.
+class GenerationStats:
+    FIELDS = ("fill_diagonal_time", "fill_remaining_time", "remove_cells_time", "nodes", "backtracks",
+              "max_depth", "count_nodes", "is_valid_calls", "restarts")
+
+    def __init__(self):
+        for field in self.FIELDS:
+            setattr(self, field, 0)
+
+    # Adds another GenerationStats into this one, keeping the largest max_depth
+    def add(self, other):
+        for field in self.FIELDS:
+            if field == "max_depth":
+                self.max_depth = max(self.max_depth, other.max_depth)
+            else:
+                setattr(self, field, getattr(self, field) + getattr(other, field))
+
+    def as_dict(self):
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+    def __repr__(self):
+        return "GenerationStats(%s)" % ", ".join("%s=%r" % item for item in self.as_dict().items())
+
+
+# A SudokuGenerator that records what it does into a GenerationStats
+# The counting lives in this subclass so that SudokuGenerator itself pays nothing for it;
+# generate_sudoku only uses it when it is given a stats object
+class InstrumentedGenerator(SudokuGenerator):
+    def __init__(self, row_length, removed_cells, unique=False, rng=None, stats=None):
+        super().__init__(row_length, removed_cells, unique, rng)
+        self.stats = stats if stats is not None else GenerationStats()
+        self.depth = 0
+        self.diagonal_fills = 0
+
+    def used_mask(self, row, col):
+        self.stats.is_valid_calls += 1
+        return super().used_mask(row, col)
+
+    def fill_diagonal(self):
+        if self.diagonal_fills:
+            self.stats.restarts += 1
+        self.diagonal_fills += 1
+        start = time.perf_counter()
+        super().fill_diagonal()
+        self.stats.fill_diagonal_time += time.perf_counter() - start
+
+    # Tracks one node of the search, timing the outermost call as the fill_remaining phase
+    def fill_remaining(self, row, col):
+        stats = self.stats
+        stats.nodes += 1
+        self.depth += 1
+        stats.max_depth = max(stats.max_depth, self.depth)
+        start = time.perf_counter() if self.depth == 1 else 0
+        finished = super().fill_remaining(row, col)
+        if not finished:
+            stats.backtracks += 1
+        if self.depth == 1:
+            stats.fill_remaining_time += time.perf_counter() - start
+        self.depth -= 1
+        return finished
+
+    # fill_constrained fills the same part of the board as fill_remaining on other sizes
+    # Time spent in the restarts' fill_diagonal calls is counted in both phases
+    def fill_constrained(self, node_budget=None):
+        start = time.perf_counter()
+        finished = super().fill_constrained(node_budget)
+        self.stats.fill_remaining_time += time.perf_counter() - start
+        return finished
+
+    # The iterative search keeps its own counters, which are added once it returns
+    def fill_search(self, node_budget=None, timeout=None):
+        result = super().fill_search(node_budget, timeout)
+        stats = self.stats
+        stats.nodes += self.search_nodes
+        stats.backtracks += self.search_backtracks
+        stats.max_depth = max(stats.max_depth, self.search_depth)
+        stats.is_valid_calls += self.search_probes
+        return result
+
+    def search_count(self, empty, limit):
+        self.stats.count_nodes += 1
+        self.stats.is_valid_calls += len(empty)
+        return super().search_count(empty, limit)
+
     def remove_cells(self):
-        for i in range(self.removed_cells):
-            r_row = random.randint(0, 8)
-            r_col = random.randint(0, 8)
-            while self.board[r_row][r_col] == 0:
-                r_row = random.randint(0, 8)
-                r_col = random.randint(0, 8)
-            self.board[r_row][r_col] = 0
+        start = time.perf_counter()
+        super().remove_cells()
+        self.stats.remove_cells_time += time.perf_counter() - start
+
+
+# Pass a GenerationStats as stats to have it filled in with timings and search counters
+def generate_sudoku(size, removed, unique=False, rng=None, stats=None):
+    board, solution = generate_sudoku_and_solution(size, removed, unique, rng, stats)
+    return board
 
 
-def generate_sudoku(size, removed):
-    sudoku = SudokuGenerator(size, removed)
+# Same as generate_sudoku, but also returns a copy of the solved grid the puzzle was cut from
+def generate_sudoku_and_solution(size, removed, unique=False, rng=None, stats=None):
+    if stats is None:
+        sudoku = SudokuGenerator(size, removed, unique, rng)
+    else:
+        sudoku = InstrumentedGenerator(size, removed, unique, rng, stats)
     sudoku.fill_values()
-    board = sudoku.get_board()
+    solution = [row[:] for row in sudoku.get_board()]
     sudoku.remove_cells()
     board = sudoku.get_board()
-    return board
+    return board, solution
+
+
+# Returns a solved copy of a board (a list of rows, 0 for empty), or None if it has no solution
+def solve_sudoku(board, rng=None):
+    sudoku = SudokuGenerator(len(board), 0, rng=rng)
+    if not sudoku.load_board(board) or not sudoku.solve():
+        return None
+    return sudoku.get_board()
+
+
+# Generates one chunk of puzzles for generate_many
+# Each chunk seeds its own random.Random from the batch seed and the chunk index, so the
+# output does not depend on which worker runs the chunk or on how many workers there are
+# With stats, every puzzle is returned as (puzzle, stats dict), and the dict records the seed,
+# chunk and position that identify the puzzle
+def generate_chunk(task):
+    size, removed, unique, seed, index, count, stats = task
+    rng = random.Random("%s:%d" % (seed, index))
+    if not stats:
+        return [generate_sudoku(size, removed, unique, rng) for i in range(count)]
+    puzzles = []
+    for position in range(count):
+        puzzle_stats = GenerationStats()
+        puzzle = generate_sudoku(size, removed, unique, rng, puzzle_stats)
+        record = puzzle_stats.as_dict()
+        record.update(seed=seed, chunk=index, position=position)
+        puzzles.append((puzzle, record))
+    return puzzles
+
+
+# Generates count puzzles across a pool of worker processes and yields them as they finish
+# Puzzles are produced in chunks of chunk_size and yielded in order, so the same seed always
+# gives the same sequence of puzzles. workers=1 generates in this process without a pool.
+# With stats=True every item is a (puzzle, stats dict) pair instead of just the puzzle.
+def generate_many(count, removed, workers=None, seed=None, size=9, unique=False, chunk_size=50, stats=False):
+    if seed is None:
+        seed = random.getrandbits(64)
+    tasks = []
+    for index, start in enumerate(range(0, count, chunk_size)):
+        tasks.append((size, removed, unique, seed, index, min(chunk_size, count - start), stats))
+    if workers == 1:
+        for task in tasks:
+            yield from generate_chunk(task)
+        return
+    # Imported here so that importing the generator (e.g. for the CLI) stays fast
+    import multiprocessing
+    with multiprocessing.Pool(workers) as pool:
+        for chunk in pool.imap(generate_chunk, tasks):
+            yield from chunk
@@ -0,0 +1,206 @@
+import os
+import random
+import time
+from collections import deque
+
+from sudoku_generator import GenerationStats, InstrumentedGenerator, SudokuGenerator
+
+# Anytime search for minimal 9x9 puzzles: puzzles with a unique solution from which no clue can be
+# removed without allowing a second one. remove_cells stops after a fixed number of cells; this
+# search keeps going for as long as its budget allows and returns the sparsest puzzle it has found.
+#
+# Every restart starts from a fresh grid filled by SudokuGenerator and strips it down:
+#   1. every clue is tried once, in a random order, and removed if the solution stays unique. One
+#      pass is enough to reach a minimal puzzle: a clue that cannot go now can never go later, since
+#      taking clues away only adds solutions.
+#   2. the minimal puzzle is then improved by exchanges: one removed clue is put back and all the
+#      other clues are stripped again in a new random order. The result replaces the puzzle when it
+#      has no more clues than before, so the search can also move sideways between minimal puzzles
+#      of the same size. After patience exchanges in a row without fewer clues, the restart ends.
+# The budget is wall-clock seconds, search nodes of the uniqueness checks (GenerationStats.count_nodes),
+# a number of restarts, or any mix of them. No restart gets more than 1/RESTART_SLICES of the time or
+# node budget, so several restarts finish, and report progress, before the budget runs out. A restart
+# that runs out of budget halfway through a pass still returns a puzzle with a unique solution, but
+# it may not be minimal.
+
+
+# Fewest uniqueness-check nodes a restart is started with under a node budget; the first pass that
+# makes a grid minimal takes about 5000 nodes, and rarely more than 20000
+RESTART_NODES = 20000
+# Largest share of the time or node budget one restart may use
+RESTART_SLICES = 8
+
+
+# Tells a restart when to stop: at a time.time() deadline, or after nodes uniqueness-check nodes
+class SearchBudget:
+    def __init__(self, stats, deadline=None, nodes=None):
+        self.stats = stats
+        self.deadline = deadline
+        self.nodes = nodes
+
+    def exhausted(self):
+        if self.nodes is not None and self.stats.count_nodes >= self.nodes:
+            return True
+        return self.deadline is not None and time.time() >= self.deadline
+
+
+# Returns the (row, col) of every clue on the generator's board
+def clue_cells(sudoku):
+    return [(row, col) for row in range(9) for col in range(9) if sudoku.board[row][col] != 0]
+
+
+# Removes each clue at cells, in order, if the solution stays unique without it
+# Returns (the cells removed, whether every cell was tried before the budget ran out)
+def strip_clues(sudoku, cells, budget):
+    removed = []
+    for row, col in cells:
+        if budget.exhausted():
+            return removed, False
+        if sudoku.removable(row, col):
+            sudoku.unplace(row, col)
+            removed.append((row, col))
+    return removed, True
+
+
+# Runs one restart for find_minimal, in a worker process or inline
+# task is (seed, index, deadline, nodes, patience); the restart's random.Random is seeded from the
+# seed and the restart index, so a node budget gives the same puzzles on every run
+# Returns a dict with the sparsest puzzle of the restart and what the restart cost
+def search_restart(task):
+    seed, index, deadline, nodes, patience = task
+    rng = random.Random("%s:%d" % (seed, index))
+    stats = GenerationStats()
+    budget = SearchBudget(stats, deadline, nodes)
+    sudoku = InstrumentedGenerator(9, 0, True, rng, stats)
+    sudoku.fill_values()
+    solution = [row[:] for row in sudoku.get_board()]
+    cells = clue_cells(sudoku)
+    rng.shuffle(cells)
+    removed, minimal = strip_clues(sudoku, cells, budget)
+    clues = 81 - len(removed)
+    best = [row[:] for row in sudoku.get_board()]
+    best_clues = clues
+    exchanges = 0
+    stale = 0
+    while minimal and stale < patience and not budget.exhausted():
+        exchanges += 1
+        holes = [(row, col) for row in range(9) for col in range(9) if sudoku.board[row][col] == 0]
+        row, col = rng.choice(holes)
+        sudoku.place(row, col, solution[row][col])
+        others = [cell for cell in clue_cells(sudoku) if cell != (row, col)]
+        rng.shuffle(others)
+        removed, finished = strip_clues(sudoku, others, budget)
+        if finished and len(removed) >= 1:
+            # The exchange is kept: one clue in, at least one out
+            clues += 1 - len(removed)
+            if clues < best_clues:
+                best = [line[:] for line in sudoku.get_board()]
+                best_clues = clues
+                stale = 0
+            else:
+                stale += 1
+        else:
+            # Undoes the exchange, which either added a clue or was cut short by the budget
+            for cell in removed:
+                sudoku.place(cell[0], cell[1], solution[cell[0]][cell[1]])
+            sudoku.unplace(row, col)
+            stale += 1
+    return {"index": index, "puzzle": best, "solution": solution, "clues": best_clues,
+            "minimal": minimal, "exchanges": exchanges, "nodes": stats.count_nodes}
+
+
+# Searches for the sparsest minimal puzzle it can find within a budget, and returns it
+# The budget is any mix of timeout (seconds), nodes (uniqueness-check nodes across all restarts) and
+# max_restarts; at least one is needed. Restarts run on a pool of workers processes (one per CPU by
+# default, 1 for none), at most one per worker at a time, and each gets at most 1/RESTART_SLICES of
+# the time and of the nodes. progress, if given, is called with a dict of the totals so far after
+# every restart.
+# Returns a dict: puzzle, solution, clues and minimal for the best puzzle, plus restarts, nodes and
+# elapsed seconds for the whole search. Stopping it with Ctrl+C returns the best puzzle found so far.
+def find_minimal(timeout=None, nodes=None, max_restarts=None, workers=None, seed=None, patience=100,
+                 progress=None):
+    if timeout is None and nodes is None and max_restarts is None:
+        raise ValueError("the search needs a time, node or restart budget")
+    if seed is None:
+        seed = random.getrandbits(64)
+    start = time.perf_counter()
+    deadline = time.time() + timeout if timeout is not None else None
+    totals = {"restarts": 0, "nodes": 0}
+    # Nodes promised to the restarts that are still running
+    allocated = [0]
+    best = None
+
+    # Returns the next restart's task, or None once the budget is used up
+    def next_task(submitted, slots):
+        if max_restarts is not None and submitted >= max_restarts:
+            return None
+        now = time.time()
+        if deadline is not None and now >= deadline:
+            return None
+        restart_deadline = deadline
+        if timeout is not None:
+            restart_deadline = min(deadline, now + timeout / RESTART_SLICES)
+        share = None
+        if nodes is not None:
+            left = nodes - totals["nodes"] - allocated[0]
+            # A restart with less than RESTART_NODES would rarely finish its first pass, so the
+            # leftovers are not worth starting one for, once there is any result at all
+            if left <= 0 or (left < RESTART_NODES and (best is not None or allocated[0])):
+                return None
+            share = min(left, max(RESTART_NODES, nodes // RESTART_SLICES))
+            allocated[0] += share
+        return seed, submitted, restart_deadline, share, patience
+
+    # Adds a finished restart to the totals, keeping the sparsest puzzle
+    def finish(task, result):
+        nonlocal best
+        if task[3] is not None:
+            allocated[0] -= task[3]
+        totals["restarts"] += 1
+        totals["nodes"] += result["nodes"]
+        if best is None or (result["clues"], not result["minimal"]) < (best["clues"], not best["minimal"]):
+            best = result
+        if progress is not None:
+            progress({"elapsed": time.perf_counter() - start, "restarts": totals["restarts"],
+                      "nodes": totals["nodes"], "clues": best["clues"], "last": result["clues"]})
+
+    try:
+        if workers == 1:
+            task = next_task(0, 1)
+            while task is not None:
+                finish(task, search_restart(task))
+                task = next_task(task[1] + 1, 1)
+        else:
+            # Imported here so that importing this module stays fast
+            import multiprocessing
+            slots = workers or os.cpu_count() or 1
+            with multiprocessing.Pool(slots) as pool:
+                pending = deque()
+                submitted = 0
+                while True:
+                    while len(pending) < slots:
+                        task = next_task(submitted, slots)
+                        if task is None:
+                            break
+                        pending.append((task, pool.apply_async(search_restart, (task,))))
+                        submitted += 1
+                    if not pending:
+                        break
+                    task, result = pending.popleft()
+                    finish(task, result.get())
+    except KeyboardInterrupt:
+        if best is None:
+            raise
+    if best is None:
+        raise ValueError("the budget ran out before the first restart")
+    return {"puzzle": best["puzzle"], "solution": best["solution"], "clues": best["clues"],
+            "minimal": best["minimal"], "restarts": totals["restarts"], "nodes": totals["nodes"],
+            "elapsed": time.perf_counter() - start}
+
+
+# Returns True if no clue of a puzzle with a unique solution can be removed without a second solution
+def is_minimal(puzzle):
+    sudoku = SudokuGenerator(9, 0, True)
+    if not sudoku.load_board(puzzle) or sudoku.count_solutions(2) != 1:
+        return False
+    return all(not sudoku.removable(row, col) for row, col in clue_cells(sudoku))
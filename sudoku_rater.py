@@ -0,0 +1,308 @@
+import random
+from itertools import combinations
+
+from sudoku_board import PEERS, UNITS
+from sudoku_generator import generate_sudoku_and_solution
+
+# Grades 9x9 puzzles by the human solving techniques they need, rather than by how many cells
+# are empty. The rater repeatedly applies the easiest technique that makes progress and starts
+# over from the easiest one after every success. Candidates are kept as bitmasks, with bit d set
+# when digit d is still possible, the same layout as the generator's occupancy masks.
+
+# Techniques in the order they are tried, with the score each application adds
+TECHNIQUES = [
+    ("naked single", 1),
+    ("hidden single", 2),
+    ("locked candidates", 5),
+    ("naked pair", 8),
+    ("hidden pair", 10),
+    ("naked triple", 12),
+    ("hidden triple", 15),
+    ("x-wing", 20),
+    ("swordfish", 25),
+]
+# Reported as the hardest technique when none of the above can finish the puzzle
+TRIAL_AND_ERROR = "trial and error"
+TRIAL_AND_ERROR_SCORE = 100
+
+# Rating bands that generate_rated can aim for: the lowest and highest technique (as an index into
+# TECHNIQUES, len(TECHNIQUES) meaning trial and error) the hardest step may use, and how many cells
+# to remove from each candidate puzzle
+RATING_BANDS = {
+    "easy": (0, 1, 40),
+    "medium": (2, 2, 50),
+    "hard": (3, 6, 54),
+    "expert": (7, len(TECHNIQUES), 58),
+}
+
+ALL_DIGITS = 0b1111111110
+
+# Row-box and column-box intersections, each as (shared cells, rest of the box, rest of the line)
+INTERSECTIONS = []
+for box_unit in UNITS[18:]:
+    for line_unit in UNITS[:18]:
+        shared = [index for index in box_unit if index in line_unit]
+        if shared:
+            INTERSECTIONS.append((shared, [index for index in box_unit if index not in shared],
+                                  [index for index in line_unit if index not in shared]))
+
+
+# Result of rate_puzzle
+# score is the sum of the scores of every step taken, hardest the name of the hardest technique
+# used, level its index in TECHNIQUES, and counts how often each technique was applied.
+# solved is False when the techniques got stuck (hardest is then TRIAL_AND_ERROR) or the
+# puzzle turned out to be contradictory (hardest is then None).
+class Rating:
+    __slots__ = ("score", "hardest", "level", "solved", "counts")
+
+    def __init__(self, score, hardest, level, solved, counts):
+        self.score = score
+        self.hardest = hardest
+        self.level = level
+        self.solved = solved
+        self.counts = counts
+
+    def as_dict(self):
+        return {"score": self.score, "hardest": self.hardest, "level": self.level,
+                "solved": self.solved, "counts": self.counts}
+
+    def __repr__(self):
+        return "Rating(score=%r, hardest=%r, solved=%r)" % (self.score, self.hardest, self.solved)
+
+
+# Raised inside the rater when a cell runs out of candidates
+class Contradiction(Exception):
+    pass
+
+
+# Candidate state of one puzzle being rated
+class CandidateGrid:
+    __slots__ = ("values", "cands", "empty")
+
+    def __init__(self, board):
+        self.values = bytearray(81)
+        self.cands = [ALL_DIGITS] * 81
+        self.empty = 81
+        for index in range(81):
+            value = board[index // 9][index % 9]
+            if value:
+                if not self.cands[index] >> value & 1:
+                    raise Contradiction()
+                self.place(index, value)
+
+    # Fills a cell and removes its digit from the candidates of its 20 peers
+    def place(self, index, value):
+        bit = 1 << value
+        cands = self.cands
+        self.values[index] = value
+        cands[index] = 0
+        self.empty -= 1
+        for peer in PEERS[index]:
+            if cands[peer] & bit:
+                cands[peer] ^= bit
+
+    # Removes the digits in mask from every cell in cells; returns True if anything changed
+    def eliminate(self, cells, mask):
+        cands = self.cands
+        changed = False
+        for index in cells:
+            if cands[index] & mask:
+                cands[index] &= ~mask
+                if not cands[index]:
+                    raise Contradiction()
+                changed = True
+        return changed
+
+    # Each technique returns how many times it was applied, 0 if it found nothing
+
+    def naked_singles(self):
+        cands = self.cands
+        values = self.values
+        found = 0
+        for index in range(81):
+            if not values[index]:
+                mask = cands[index]
+                if not mask:
+                    raise Contradiction()
+                if not mask & (mask - 1):
+                    self.place(index, mask.bit_length() - 1)
+                    found += 1
+        return found
+
+    def hidden_singles(self):
+        cands = self.cands
+        found = 0
+        for unit in UNITS:
+            once = 0
+            twice = 0
+            for index in unit:
+                mask = cands[index]
+                twice |= once & mask
+                once |= mask
+            single = once & ~twice
+            while single:
+                bit = single & -single
+                single ^= bit
+                for index in unit:
+                    if cands[index] & bit:
+                        self.place(index, bit.bit_length() - 1)
+                        found += 1
+                        break
+        return found
+
+    # Pointing and claiming: a digit confined to where a box meets a line can be removed from the
+    # rest of the line (pointing) or the rest of the box (claiming)
+    def locked_candidates(self):
+        cands = self.cands
+        found = 0
+        for shared, box_rest, line_rest in INTERSECTIONS:
+            shared_mask = 0
+            for index in shared:
+                shared_mask |= cands[index]
+            if not shared_mask:
+                continue
+            box_mask = 0
+            for index in box_rest:
+                box_mask |= cands[index]
+            line_mask = 0
+            for index in line_rest:
+                line_mask |= cands[index]
+            pointing = shared_mask & ~box_mask & line_mask
+            if pointing and self.eliminate(line_rest, pointing):
+                found += 1
+            claiming = shared_mask & ~line_mask & box_mask
+            if claiming and self.eliminate(box_rest, claiming):
+                found += 1
+        return found
+
+    # size cells of a unit whose candidates together hold exactly size digits
+    def naked_subsets(self, size):
+        cands = self.cands
+        found = 0
+        for unit in UNITS:
+            open_cells = [index for index in unit if cands[index]]
+            if len(open_cells) <= size:
+                continue
+            small = [index for index in open_cells if cands[index].bit_count() <= size]
+            for group in combinations(small, size):
+                mask = 0
+                for index in group:
+                    mask |= cands[index]
+                if mask.bit_count() == size:
+                    others = [index for index in open_cells if index not in group]
+                    if self.eliminate(others, mask):
+                        found += 1
+        return found
+
+    # size digits of a unit that together fit in exactly size cells
+    def hidden_subsets(self, size):
+        cands = self.cands
+        found = 0
+        for unit in UNITS:
+            # positions[d] has bit p set when unit[p] can still hold digit d
+            positions = {}
+            for position in range(9):
+                mask = cands[unit[position]]
+                while mask:
+                    bit = mask & -mask
+                    mask ^= bit
+                    digit = bit.bit_length() - 1
+                    positions[digit] = positions.get(digit, 0) | 1 << position
+            if len(positions) <= size:
+                continue
+            digits = [digit for digit, spots in positions.items() if 2 <= spots.bit_count() <= size]
+            for group in combinations(digits, size):
+                spots = 0
+                keep = 0
+                for digit in group:
+                    spots |= positions[digit]
+                    keep |= 1 << digit
+                if spots.bit_count() == size:
+                    for position in range(9):
+                        if spots >> position & 1:
+                            index = unit[position]
+                            if cands[index] & ~keep:
+                                cands[index] &= keep
+                                found += 1
+        return found
+
+    # X-wing (size 2) and swordfish (size 3): size rows whose candidates for a digit lie in exactly
+    # size columns clear that digit from the rest of those columns, and the same with rows and
+    # columns swapped
+    def fish(self, size):
+        cands = self.cands
+        found = 0
+        for digit in range(1, 10):
+            bit = 1 << digit
+            for lines, crosses in ((UNITS[:9], UNITS[9:18]), (UNITS[9:18], UNITS[:9])):
+                spots = []
+                for line in lines:
+                    mask = 0
+                    for position in range(9):
+                        if cands[line[position]] & bit:
+                            mask |= 1 << position
+                    spots.append(mask)
+                chosen = [number for number in range(9) if 2 <= spots[number].bit_count() <= size]
+                for group in combinations(chosen, size):
+                    cover = 0
+                    for number in group:
+                        cover |= spots[number]
+                    if cover.bit_count() != size:
+                        continue
+                    targets = [crosses[position][number] for position in range(9) if cover >> position & 1
+                               for number in range(9) if number not in group]
+                    if self.eliminate(targets, bit):
+                        found += 1
+        return found
+
+
+# Technique implementations, in the same order as TECHNIQUES
+STEPS = [
+    CandidateGrid.naked_singles,
+    CandidateGrid.hidden_singles,
+    CandidateGrid.locked_candidates,
+    lambda grid: grid.naked_subsets(2),
+    lambda grid: grid.hidden_subsets(2),
+    lambda grid: grid.naked_subsets(3),
+    lambda grid: grid.hidden_subsets(3),
+    lambda grid: grid.fish(2),
+    lambda grid: grid.fish(3),
+]
+
+
+# Rates a 9x9 puzzle (a list of rows, 0 for empty) and returns a Rating
+def rate_puzzle(board):
+    counts = {}
+    score = 0
+    level = -1
+    try:
+        grid = CandidateGrid(board)
+        while grid.empty:
+            for number in range(len(STEPS)):
+                found = STEPS[number](grid)
+                if found:
+                    name, step_score = TECHNIQUES[number]
+                    counts[name] = counts.get(name, 0) + found
+                    score += found * step_score
+                    level = max(level, number)
+                    break
+            else:
+                counts[TRIAL_AND_ERROR] = 1
+                return Rating(score + TRIAL_AND_ERROR_SCORE, TRIAL_AND_ERROR, len(TECHNIQUES), False, counts)
+    except Contradiction:
+        return Rating(score, None, -1, False, counts)
+    return Rating(score, TECHNIQUES[level][0] if level >= 0 else None, level, True, counts)
+
+
+# Generates unique puzzles until one's hardest technique falls inside a rating band
+# band is a key of RATING_BANDS or a (lowest level, highest level, cells to remove) tuple.
+# Returns (puzzle, solution, rating), or None if max_attempts puzzles all missed the band.
+def generate_rated(band, rng=None, max_attempts=1000):
+    lowest, highest, removed = RATING_BANDS[band] if isinstance(band, str) else band
+    rng = rng if rng is not None else random
+    for attempt in range(max_attempts):
+        puzzle, solution = generate_sudoku_and_solution(9, removed, True, rng)
+        rating = rate_puzzle(puzzle)
+        if lowest <= rating.level <= highest:
+            return puzzle, solution, rating
+    return None
@@ -0,0 +1,82 @@
+import random
+from itertools import permutations
+
+from sudoku_generator import generate_sudoku_and_solution
+
+# Derives new 9x9 boards from existing ones with validity-preserving symmetries: relabeling the
+# digits, permuting the rows inside each band, permuting the bands, doing the same for columns and
+# stacks, and transposing. That gives 9! * 6^8 * 2 variants of every grid, each one produced in O(81)
+# instead of paying for a full backtracking fill. Applying the same transform to a puzzle and its
+# solution keeps the puzzle's solution unique and its difficulty unchanged.
+#
+# Boards are handled in flat row-major form (81 values, 0 for empty) on the fast path; rows_to_flat and
+# flat_to_rows convert from and to the list of rows that generate_sudoku returns.
+
+
+# The six orders of three rows in a band, or three bands in the grid
+ORDERS = list(permutations(range(3)))
+
+
+# Returns a random (cell order, digit map) pair describing one symmetry transform
+# cell order[i] is the source cell that moves to cell i; digit map[d] is the new label of digit d
+def random_transform(rng=random):
+    choice = rng.choice
+    rows = [band * 3 + row for band in choice(ORDERS) for row in choice(ORDERS)]
+    cols = [stack * 3 + col for stack in choice(ORDERS) for col in choice(ORDERS)]
+    if rng.random() < 0.5:
+        order = [row * 9 + col for row in rows for col in cols]
+    else:
+        order = [row * 9 + col for col in cols for row in rows]
+    digits = [0] + rng.sample(range(1, 10), 9)
+    return order, digits
+
+
+# Applies a transform to a flat board and returns the new flat board as a list
+def apply_transform(flat, transform):
+    order, digits = transform
+    return [digits[flat[source]] for source in order]
+
+
+def rows_to_flat(board):
+    return [value for row in board for value in row]
+
+
+def flat_to_rows(flat):
+    return [list(flat[row * 9:row * 9 + 9]) for row in range(9)]
+
+
+# Returns a random variant of a solved grid (a list of rows)
+def derive_solution(solution, rng=random):
+    return flat_to_rows(apply_transform(rows_to_flat(solution), random_transform(rng)))
+
+
+# Returns a random variant of a puzzle and its solution, transformed together
+def derive_puzzle(puzzle, solution, rng=random):
+    transform = random_transform(rng)
+    return (flat_to_rows(apply_transform(rows_to_flat(puzzle), transform)),
+            flat_to_rows(apply_transform(rows_to_flat(solution), transform)))
+
+
+# Yields count variants of a puzzle and its solution as (puzzle, solution) pairs
+# With flat=True the boards are yielded as flat 81-value lists, which skips building rows
+def derive_many(puzzle, solution, count, rng=random, flat=False):
+    puzzle = rows_to_flat(puzzle)
+    solution = rows_to_flat(solution)
+    for i in range(count):
+        transform = random_transform(rng)
+        new_puzzle = apply_transform(puzzle, transform)
+        new_solution = apply_transform(solution, transform)
+        if flat:
+            yield new_puzzle, new_solution
+        else:
+            yield flat_to_rows(new_puzzle), flat_to_rows(new_solution)
+
+
+# Bulk generation mode: builds seeds puzzles the normal way with generate_sudoku_and_solution, then
+# yields count (puzzle, solution) pairs derived from them in turn
+def generate_derived(count, removed, seeds=1, unique=True, rng=None, flat=False):
+    rng = rng if rng is not None else random
+    bases = [generate_sudoku_and_solution(9, removed, unique, rng) for i in range(seeds)]
+    for i in range(count):
+        puzzle, solution = bases[i % seeds]
+        yield next(derive_many(puzzle, solution, 1, rng, flat))
@@ -0,0 +1,58 @@
+import math
+
+import numpy as np
+
+# Vectorized board checks: sudoku_bulk validates each chunk of boards, and sudoku_cli validate each
+# board, with one call to validate_boards and validate_givens per stack of boards of the same size
+
+
+# Returns boards as an (N, n, n) array, turning a single (n, n) board into a stack of one
+def board_stack(boards):
+    boards = np.asarray(boards)
+    if boards.ndim == 2:
+        boards = boards[np.newaxis]
+    return boards
+
+
+# Returns a boolean array with one value per board: True if every cell holds 0..n
+def cells_in_range(boards):
+    return ((boards >= 0) & (boards <= boards.shape[-1])).all(axis=(1, 2))
+
+
+# Counts how often each digit appears in every row, column and box of a stack of boards
+# boards is an (N, n, n) integer array (a single (n, n) board is also accepted) where n is a
+# perfect square. Returns an (N, 3 * n, n) array: rows first, then columns, then boxes, and
+# for each of those units the number of times digits 1..n occur in it
+def unit_counts(boards):
+    boards = board_stack(boards)
+    count, size = boards.shape[0], boards.shape[-1]
+    box = math.isqrt(size)
+    # One-hot encodes the digits; zeros and out-of-range values match no digit
+    one_hot = boards[..., np.newaxis] == np.arange(1, size + 1, dtype=boards.dtype)
+    boxes = one_hot.reshape(count, box, box, box, box, size).transpose(0, 1, 3, 2, 4, 5)
+    boxes = boxes.reshape(count, size, size, size)
+    return np.concatenate((
+        one_hot.sum(axis=2, dtype=np.uint8),
+        one_hot.sum(axis=1, dtype=np.uint8),
+        boxes.sum(axis=2, dtype=np.uint8),
+    ), axis=1)
+
+
+# Returns a boolean array with one verdict per board: True if the board is completely and
+# correctly solved, so every row, column and box holds each digit exactly once
+# An empty batch, such as [] or an array of shape (0, 9, 9), gives an empty array
+def validate_boards(boards):
+    boards = board_stack(boards)
+    if len(boards) == 0:
+        return np.zeros(0, bool)
+    return cells_in_range(boards) & (unit_counts(boards) == 1).all(axis=(1, 2))
+
+
+# Returns a boolean array with one verdict per board: True if the filled-in cells of a
+# partially solved board (0 marks an empty cell) never repeat a digit in a row, column or box
+# An empty batch gives an empty array, as for validate_boards
+def validate_givens(boards):
+    boards = board_stack(boards)
+    if len(boards) == 0:
+        return np.zeros(0, bool)
+    return cells_in_range(boards) & (unit_counts(boards) <= 1).all(axis=(1, 2))
@@ -0,0 +1,64 @@
+import random
+
+import pytest
+
+from puzzle_bank import (DIFFICULTY_BANDS, HEADER_SIZE, INDEX_SLOTS, RECORD_SIZE, PuzzleBank, rated_puzzle,
+                         write_bank)
+from sudoku_rater import RATING_BANDS, rate_puzzle
+
+
+@pytest.mark.parametrize("difficulty", list(DIFFICULTY_BANDS))
+def test_menu_difficulties_get_puzzles_from_their_band(difficulty):
+    random.seed(3)
+    puzzle, solution = rated_puzzle(difficulty)
+    lowest, highest, removed = RATING_BANDS[DIFFICULTY_BANDS[difficulty]]
+    assert lowest <= rate_puzzle(puzzle).level <= highest
+    assert all(value in (0, solution[row][col]) for row in range(9) for col, value in enumerate(puzzle[row]))
+
+
+def test_bank_round_trip(tmp_path):
+    path = str(tmp_path / "puzzles.bank")
+    entries = {"easy": [rated_puzzle("easy") for _ in range(3)], "hard": []}
+    write_bank(path, entries)
+    bank = PuzzleBank(path)
+    try:
+        assert bank.count("easy") == 3 and bank.count("hard") == 0
+        assert [bank.get("easy", index) for index in range(3)] == entries["easy"]
+        assert bank.random_puzzle("hard") is None
+    finally:
+        bank.close()
+
+
+# Writes a small bank and returns its bytes
+def bank_bytes(tmp_path):
+    path = str(tmp_path / "whole.bank")
+    write_bank(path, {"easy": [rated_puzzle("easy") for _ in range(2)]})
+    with open(path, "rb") as file:
+        return file.read()
+
+
+@pytest.mark.parametrize("cut", [0, 3, 10, HEADER_SIZE - 1, HEADER_SIZE, HEADER_SIZE + RECORD_SIZE + 5])
+def test_truncated_bank_raises_value_error_and_closes_the_file(tmp_path, monkeypatch, cut):
+    data = bank_bytes(tmp_path)
+    path = tmp_path / "cut.bank"
+    path.write_bytes(data[:cut])
+    opened = []
+    real_open = open
+
+    def tracking_open(*args, **kwargs):
+        opened.append(real_open(*args, **kwargs))
+        return opened[-1]
+
+    monkeypatch.setattr("builtins.open", tracking_open)
+    with pytest.raises(ValueError):
+        PuzzleBank(str(path))
+    assert opened and all(file.closed for file in opened)
+
+
+def test_damaged_header_is_rejected(tmp_path):
+    data = bytearray(bank_bytes(tmp_path))
+    data[6] = INDEX_SLOTS + 1
+    path = tmp_path / "damaged.bank"
+    path.write_bytes(bytes(data))
+    with pytest.raises(ValueError):
+        PuzzleBank(str(path))
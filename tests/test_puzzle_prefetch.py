@@ -0,0 +1,53 @@
+import threading
+
+from puzzle_prefetch import PuzzlePrefetcher
+
+
+# Stands in for load_puzzle: returns (difficulty, number of the call) and counts the calls
+class CountingSource:
+    def __init__(self):
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def __call__(self, difficulty):
+        with self.lock:
+            self.calls.append(difficulty)
+            return difficulty, len(self.calls)
+
+
+def test_every_difficulty_is_primed_without_a_get():
+    source = CountingSource()
+    prefetcher = PuzzlePrefetcher(("easy", "medium", "hard"), source)
+    prefetcher.work.join()
+    assert source.calls == ["easy", "medium", "hard"]
+    assert prefetcher.ready == {"easy": ("easy", 1), "medium": ("medium", 2), "hard": ("hard", 3)}
+
+
+def test_get_takes_the_ready_puzzle_and_builds_one_more():
+    source = CountingSource()
+    prefetcher = PuzzlePrefetcher(("easy", "hard"), source)
+    prefetcher.work.join()
+    assert prefetcher.get("hard") == ("hard", 2)
+    prefetcher.work.join()
+    assert source.calls == ["easy", "hard", "hard"]
+    assert prefetcher.ready == {"easy": ("easy", 1), "hard": ("hard", 3)}
+
+
+def test_at_most_one_puzzle_waits_per_difficulty():
+    source = CountingSource()
+    prefetcher = PuzzlePrefetcher(("easy", "medium"), source)
+    prefetcher.work.join()
+    for _ in range(5):
+        prefetcher.get("easy")
+        prefetcher.work.join()
+    assert sorted(prefetcher.ready) == ["easy", "medium"]
+    assert source.calls.count("medium") == 1
+    assert source.calls.count("easy") == 6
+
+
+def test_get_builds_on_the_spot_for_a_difficulty_that_is_not_ready():
+    source = CountingSource()
+    prefetcher = PuzzlePrefetcher((), source)
+    assert prefetcher.get("expert") == ("expert", 1)
+    prefetcher.work.join()
+    assert prefetcher.ready == {"expert": ("expert", 2)}
@@ -0,0 +1,54 @@
+import asyncio
+from concurrent.futures import Executor, Future
+
+import pytest
+
+from puzzle_server import PoolBusy, PuzzlePool
+
+
+# An executor whose batches only finish when the test resolves them
+class HeldExecutor(Executor):
+    def __init__(self):
+        self.futures = []
+
+    def submit(self, fn, *args):
+        future = Future()
+        self.futures.append(future)
+        return future
+
+
+def test_timed_out_request_stops_counting_as_waiting():
+    async def run():
+        executor = HeldExecutor()
+        pool = PuzzlePool("easy", executor, low=0, high=1, batch=1, max_batches=1, max_waiting=1)
+        with pytest.raises(PoolBusy):
+            await pool.get(0.01)
+        assert len(pool.waiters) == 0
+        assert pool.metrics()["waiting"] == 0
+        # The next request waits for the batch instead of being turned away at once
+        request = asyncio.ensure_future(pool.get(5))
+        await asyncio.sleep(0.01)
+        assert len(pool.waiters) == 1
+        executor.futures[0].set_result([("puzzle", "solution")])
+        assert await request == ("puzzle", "solution")
+        assert pool.waited == 2
+        assert pool.rejected == 1
+        assert pool.served == 1
+
+    asyncio.run(run())
+
+
+def test_full_waiting_list_is_rejected_at_once():
+    async def run():
+        pool = PuzzlePool("easy", HeldExecutor(), low=0, high=1, batch=1, max_batches=1, max_waiting=1)
+        first = asyncio.ensure_future(pool.get(5))
+        await asyncio.sleep(0.01)
+        with pytest.raises(PoolBusy):
+            await pool.get(5)
+        assert pool.rejected == 1
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        assert len(pool.waiters) == 0
+
+    asyncio.run(run())
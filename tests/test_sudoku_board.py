@@ -0,0 +1,174 @@
+import random
+
+import pytest
+
+from sudoku_board import BoardState, load_session, read_session, save_session, string_to_board
+
+SOLUTION = string_to_board("534678912672195348198342567859761423426853791713924856961537284287419635345286179")
+
+
+# Returns a puzzle made from SOLUTION by emptying holes random cells
+def make_puzzle(rng, holes):
+    puzzle = [row[:] for row in SOLUTION]
+    for index in rng.sample(range(81), holes):
+        puzzle[index // 9][index % 9] = 0
+    return puzzle
+
+
+# Returns the 27 units of a board as lists of values: rows, then columns, then boxes
+def units(board):
+    rows = [list(row) for row in board]
+    cols = [[board[row][col] for row in range(9)] for col in range(9)]
+    boxes = [[board[row][col] for row in range(top, top + 3) for col in range(left, left + 3)]
+             for top in range(0, 9, 3) for left in range(0, 9, 3)]
+    return rows + cols + boxes
+
+
+# Checks the running totals of a BoardState against counting them from scratch
+def assert_totals(state):
+    board = state.get_board()
+    filled = sum(1 for row in board for value in row if value)
+    duplicates = 0
+    for number, unit in enumerate(units(board)):
+        for digit in range(1, 10):
+            assert state.counts[number * 10 + digit] == unit.count(digit)
+            duplicates += max(0, unit.count(digit) - 1)
+    assert state.filled == filled
+    assert state.duplicates == duplicates
+    assert state.is_full() == (filled == 81)
+    assert state.is_consistent() == (duplicates == 0)
+    if state.solution is not None:
+        assert state.check_board() == (filled == 81 and bytes(state.values) == state.solution)
+    else:
+        assert state.check_board() == (filled == 81 and duplicates == 0)
+
+
+# Makes a random move: a sketch, a placement, an undo, a redo or, rarely, a reset
+def random_move(state, rng, open_cells):
+    roll = rng.random()
+    if roll < 0.6:
+        row, col = rng.choice(open_cells)
+        state.select(row, col)
+        state.sketch(rng.randrange(10))
+        if rng.random() < 0.7:
+            state.place_number()
+    elif roll < 0.8:
+        state.undo()
+    elif roll < 0.97:
+        state.redo()
+    else:
+        state.reset_to_original()
+
+
+@pytest.mark.parametrize("seed", range(6))
+def test_running_totals_match_a_recount(seed):
+    rng = random.Random(seed)
+    puzzle = make_puzzle(rng, 45)
+    state = BoardState(puzzle, SOLUTION)
+    open_cells = [(row, col) for row in range(9) for col in range(9) if puzzle[row][col] == 0]
+    assert_totals(state)
+    for _ in range(400):
+        random_move(state, rng, open_cells)
+        assert_totals(state)
+
+
+def test_check_board_compares_against_the_stored_solution():
+    puzzle = make_puzzle(random.Random(7), 30)
+    state = BoardState(puzzle, SOLUTION)
+    for row in range(9):
+        for col in range(9):
+            if puzzle[row][col] == 0:
+                state.select(row, col)
+                state.sketch(SOLUTION[row][col])
+                state.place_number()
+    assert state.check_board()
+    # Swapping the digits 1 and 2 everywhere gives another valid grid, which is not the stored solution
+    swapped = [[{1: 2, 2: 1}.get(value, value) for value in row] for row in SOLUTION]
+    for solution, solved in ((SOLUTION, False), (None, True)):
+        other = BoardState([[0] * 9 for _ in range(9)], solution)
+        for row in range(9):
+            for col in range(9):
+                other.select(row, col)
+                other.sketch(swapped[row][col])
+                other.place_number()
+        assert other.is_consistent()
+        assert other.check_board() == solved
+
+
+# Checks conflicts and sketch_conflicts against looking at every peer of every cell
+def assert_conflicts(state):
+    board = state.get_board()
+    conflicts = set()
+    sketch_conflicts = set()
+    for index in range(81):
+        row, col = divmod(index, 9)
+        peers = [(r, c) for r in range(9) for c in range(9) if (r, c) != (row, col) and (
+            r == row or c == col or (r // 3, c // 3) == (row // 3, col // 3))]
+        peer_values = {board[r][c] for r, c in peers}
+        if board[row][col] and board[row][col] in peer_values:
+            conflicts.add(index)
+        if state.sketches[index] and state.sketches[index] in peer_values:
+            sketch_conflicts.add(index)
+    assert state.conflicts == conflicts
+    assert state.sketch_conflicts == sketch_conflicts
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_conflict_sets_match_a_recheck(seed):
+    rng = random.Random(100 + seed)
+    puzzle = make_puzzle(rng, 50)
+    state = BoardState(puzzle, SOLUTION)
+    open_cells = [(row, col) for row in range(9) for col in range(9) if puzzle[row][col] == 0]
+    assert_conflicts(state)
+    for _ in range(300):
+        random_move(state, rng, open_cells)
+        assert_conflicts(state)
+
+
+def test_session_round_trip(tmp_path):
+    rng = random.Random(5)
+    puzzle = make_puzzle(rng, 40)
+    state = BoardState(puzzle, SOLUTION)
+    open_cells = [(row, col) for row in range(9) for col in range(9) if puzzle[row][col] == 0]
+    for _ in range(60):
+        random_move(state, rng, open_cells)
+    # Leaves some undone moves at the end of the journal, so redo has something to restore
+    state.undo()
+    state.undo()
+    state.select(4, 2)
+    path = str(tmp_path / "session.bin")
+    save_session(path, state)
+    saved_puzzle, saved_solution, journal, moves, selected = load_session(path)
+    assert (saved_puzzle, saved_solution, selected) == (puzzle, SOLUTION, (4, 2))
+    restored = BoardState(saved_puzzle, saved_solution)
+    restored.replay(journal, moves)
+    assert restored.get_board() == state.get_board()
+    assert restored.sketches == state.sketches
+    assert restored.journal == state.journal
+    assert restored.moves == state.moves
+    assert restored.conflicts == state.conflicts
+    assert_totals(restored)
+    assert state.redo() == restored.redo()
+    assert restored.get_board() == state.get_board()
+
+
+def test_session_without_solution_round_trips():
+    state = BoardState(make_puzzle(random.Random(6), 20))
+    puzzle, solution, journal, moves, selected = read_session(state.session_bytes())
+    assert solution is None and journal == b"" and moves == 0 and selected is None
+
+
+@pytest.mark.parametrize("data", [b"", b"not a session at all", None])
+def test_damaged_session_is_rejected(data):
+    if data is None:
+        # A session cut off in the middle of its givens
+        data = BoardState(SOLUTION, SOLUTION).session_bytes()[:40]
+    with pytest.raises(ValueError):
+        read_session(data)
+
+
+def test_replay_rejects_a_journal_that_writes_to_a_given():
+    state = BoardState(make_puzzle(random.Random(8), 30))
+    given = next(index for index in range(81) if state.givens[index])
+    with pytest.raises(ValueError):
+        state.replay(bytes((given, 0, 1)), 1)
@@ -0,0 +1,72 @@
+import random
+
+import pytest
+
+from sudoku_board import board_to_string
+from sudoku_bulk import board_verdicts, completed_lines, process_lines
+from sudoku_generator import generate_sudoku_and_solution
+
+
+# Returns count input lines: puzzles, with blank and unreadable lines mixed in
+def input_lines(count):
+    rng = random.Random(11)
+    lines = []
+    for number in range(count):
+        if number % 7 == 3:
+            lines.append("\n")
+        elif number % 11 == 5:
+            lines.append("not a board\n")
+        else:
+            puzzle, solution = generate_sudoku_and_solution(9, 40, True, rng)
+            lines.append(board_to_string(puzzle) + "\n")
+    return lines
+
+
+@pytest.mark.parametrize("workers", [2, 3])
+def test_output_keeps_input_order_with_several_workers(workers):
+    lines = input_lines(60)
+    serial = [line for chunk in process_lines(lines, "solve", workers=1, chunk_size=4) for line in chunk]
+    pooled = [line for chunk in process_lines(lines, "solve", workers=workers, chunk_size=4) for line in chunk]
+    assert pooled == serial
+    assert len(pooled) == len(lines)
+    for line, result in zip(lines, pooled):
+        if not line.strip():
+            assert result == ""
+        elif line.startswith("not"):
+            assert result.startswith("error: ")
+        else:
+            assert len(result) == 81 and "0" not in result
+
+
+def test_completed_lines_cuts_off_a_partial_last_line(tmp_path):
+    path = tmp_path / "out.txt"
+    path.write_bytes(b"first\nsecond\nthi")
+    assert completed_lines(str(path)) == 2
+    assert path.read_bytes() == b"first\nsecond\n"
+
+
+def test_completed_lines_of_whole_and_missing_files(tmp_path):
+    path = tmp_path / "out.txt"
+    assert completed_lines(str(path)) == 0
+    path.write_bytes(b"")
+    assert completed_lines(str(path)) == 0
+    path.write_bytes(b"no newline yet")
+    assert completed_lines(str(path)) == 0
+    assert path.read_bytes() == b""
+    path.write_bytes(b"a\n" * 5)
+    assert completed_lines(str(path)) == 5
+    assert path.read_bytes() == b"a\n" * 5
+
+
+def test_verdicts_of_a_mixed_chunk():
+    rng = random.Random(4)
+    puzzle, solution = generate_sudoku_and_solution(9, 45, True, rng)
+    small_puzzle, small_solution = generate_sudoku_and_solution(4, 6, False, rng)
+    repeated = [row[:] for row in solution]
+    repeated[0][0] = repeated[0][1]
+    empty = [[0] * 9 for _ in range(9)]
+    boards = [puzzle, solution, small_solution, repeated, small_puzzle, empty]
+    assert board_verdicts(boards) == ["valid", "solved", "solved", "invalid", "valid", "valid"]
+    assert board_verdicts(boards, unique=True)[0] == "unique"
+    assert board_verdicts(boards, unique=True)[5] == "multiple"
+    assert board_verdicts([]) == []
@@ -0,0 +1,85 @@
+import random
+import time
+
+import pytest
+
+from sudoku_canon import HashIndex, canonical_form, canonical_hash, unique_puzzles
+from sudoku_generator import generate_sudoku_and_solution
+from sudoku_transform import derive_puzzle
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_canonical_form_is_the_same_for_every_variant(seed):
+    rng = random.Random(seed)
+    puzzle, solution = generate_sudoku_and_solution(9, 45, True, rng)
+    puzzle_form = canonical_form(puzzle)
+    solution_form = canonical_form(solution)
+    for i in range(5):
+        variant, variant_solution = derive_puzzle(puzzle, solution, rng)
+        assert canonical_form(variant) == puzzle_form
+        assert canonical_form(variant_solution) == solution_form
+
+
+@pytest.mark.parametrize("clues", [0, 1, 2, 3, 5])
+def test_near_empty_board_is_fast_and_invariant(clues):
+    rng = random.Random(clues)
+    puzzle, solution = generate_sudoku_and_solution(9, 0, False, rng)
+    cells = set(rng.sample(range(81), clues))
+    board = [[solution[row][col] if row * 9 + col in cells else 0 for col in range(9)] for row in range(9)]
+    start = time.perf_counter()
+    form = canonical_form(board)
+    # Used to take about 8 s with one clue and 32 s with none
+    assert time.perf_counter() - start < 1.0
+    assert form.count("0") == 81 - clues
+    for i in range(3):
+        assert canonical_form(derive_puzzle(board, solution, rng)[0]) == form
+
+
+def test_canonical_form_tells_different_grids_apart():
+    rng = random.Random(1)
+    forms = {canonical_form(generate_sudoku_and_solution(9, 0, False, rng)[1]) for i in range(5)}
+    assert len(forms) == 5
+
+
+def test_invalid_full_board_is_rejected():
+    puzzle, solution = generate_sudoku_and_solution(9, 0, False, random.Random(2))
+    solution[0][0] = solution[0][1]
+    with pytest.raises(ValueError):
+        canonical_form(solution)
+
+
+def test_board_with_repeated_digit_is_rejected():
+    board = [[0] * 9 for row in range(9)]
+    board[0][0] = board[4][0] = 7
+    with pytest.raises(ValueError):
+        canonical_form(board)
+
+
+def test_near_dedupe_skips_unsolvable_puzzles(tmp_path):
+    puzzle, solution = generate_sudoku_and_solution(9, 40, True, random.Random(3))
+    # Valid as it stands, but no digit fits the first empty cell of the first row
+    unsolvable = [[0] * 9 for row in range(9)]
+    unsolvable[0][:8] = [1, 2, 3, 4, 5, 6, 7, 8]
+    unsolvable[1][8] = 9
+    with HashIndex(str(tmp_path / "index")) as index:
+        kept = list(unique_puzzles([unsolvable, puzzle, puzzle], index, near=True))
+    assert kept == [puzzle]
+
+
+def test_hash_index_keeps_keys_across_growth_and_reopening(tmp_path):
+    path = str(tmp_path / "index")
+    keys = [key * 2654435761 % (1 << 64) or 1 for key in range(1, 200)]
+    with HashIndex(path, capacity=16) as index:
+        assert all(index.add(key) for key in keys)
+        assert not index.add(keys[0])
+        assert len(index) == len(keys)
+    with HashIndex(path) as index:
+        assert len(index) == len(keys)
+        assert all(key in index for key in keys)
+        assert sorted(index.keys()) == sorted(keys)
+
+
+def test_canonical_hash_is_a_nonzero_int():
+    puzzle, solution = generate_sudoku_and_solution(9, 40, True, random.Random(5))
+    assert canonical_hash(puzzle) == canonical_hash(derive_puzzle(puzzle, solution, random.Random(6))[0])
+    assert canonical_hash(puzzle) != 0
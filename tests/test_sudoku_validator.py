@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+
+from sudoku_board import string_to_board
+from sudoku_validator import validate_boards, validate_givens
+
+SOLUTION = string_to_board("534678912672195348198342567859761423426853791713924856961537284287419635345286179")
+
+
+def test_solved_board_passes_and_repeated_digit_fails():
+    broken = np.array(SOLUTION)
+    broken[0, 0], broken[0, 1] = broken[0, 1], broken[0, 0]
+    assert validate_boards([SOLUTION, broken]).tolist() == [True, False]
+    assert validate_boards(SOLUTION).tolist() == [True]
+
+
+def test_givens_allow_empty_cells_but_not_repeats():
+    puzzle = np.array(SOLUTION)
+    puzzle[::2, ::3] = 0
+    repeated = puzzle.copy()
+    repeated[8, 8] = repeated[8, 7]
+    assert validate_givens([puzzle, repeated]).tolist() == [True, False]
+    assert not validate_boards(puzzle)[0]
+
+
+@pytest.mark.parametrize("batch", [[], np.empty((0, 9, 9)), np.empty((0, 9, 9), dtype=np.int8)])
+def test_empty_batch_gives_empty_result(batch):
+    for validate in (validate_boards, validate_givens):
+        result = validate(batch)
+        assert result.dtype == bool
+        assert result.shape == (0,)
+
+
+@pytest.mark.parametrize("value", [-1, 10])
+def test_out_of_range_digit_is_rejected(value):
+    board = np.array(SOLUTION)
+    board[4, 4] = value
+    assert not validate_boards(board)[0]
+    assert not validate_givens(board)[0]